@@ -0,0 +1,272 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from typing import List, Tuple, Optional, Dict
+from parser import MazeRouterInput
+from router import MazeRouter, FRONTIERS, PATTERN_MODES, SEARCH_MODES, TOPOLOGIES
+from net_order import NET_ORDERS, net_order
+from global_router import global_route
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+TEST_CASES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_cases')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# (name, grid size, nets, max pins per net, obstacle density, seed)
+DEFAULT_SYNTHETIC = [
+    ('synthetic-64x64-40', 64, 40, 3, 0.10, 1),
+    ('synthetic-128x128-60', 128, 60, 4, 0.10, 2),
+]
+
+# Oracle match levels, best first
+ORACLE_LEVELS = ('exact', 'equal-cost', 'mismatch')
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Maze Router benchmark and regression harness')
+    parser.add_argument('--cases', nargs='*', default=None,
+                      help='Test case folders to run (default: every folder in test_cases).')
+    parser.add_argument('--synthetic', action='append', default=None, metavar='SIZE:NETS:PINS[:DENSITY[:SEED]]',
+                      help='Add a synthetic case; may be repeated. Replaces the default synthetic set.')
+    parser.add_argument('--no-synthetic', action='store_true', help='Skip synthetic cases.')
+    parser.add_argument('--search', choices=SEARCH_MODES, default='astar')
+    parser.add_argument('--frontier', choices=list(FRONTIERS), default='heap')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='chain')
+    parser.add_argument('--pattern', choices=PATTERN_MODES, default='off')
+    parser.add_argument('--order', choices=NET_ORDERS, default='input')
+    parser.add_argument('--window-margin', type=int, default=None)
+    parser.add_argument('--global-route', type=int, nargs='?', const=16, default=None, metavar='GCELL_SIZE')
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout).')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                      help='Baseline JSON to compare against (default: benchmark_baseline.json).')
+    parser.add_argument('--write-baseline', action='store_true', help='Store this run as the new baseline.')
+    parser.add_argument('--compare-searches', action='store_true',
+                      help='Run every case with each search mode and report nodes expanded and wall time '
+                           'side by side instead of comparing against the baseline.')
+    parser.add_argument('--max-slowdown', type=float, default=2.0,
+                      help='Fail when a case is this many times slower than the baseline; 0 disables (default: 2.0).')
+    return parser.parse_args()
+
+def synthetic_input(size: int, nets: int, max_pins: int, density: float, seed: int) -> MazeRouterInput:
+    """Build a reproducible random design with distinct obstacle and pin cells."""
+    rng = random.Random(seed)
+    router_input = MazeRouterInput(size, size, 10, 5)
+    cells = [(layer, x, y) for layer in (1, 2) for x in range(size) for y in range(size)]
+    rng.shuffle(cells)
+    obstacles = int(len(cells) * density)
+    router_input.obstructions = sorted(cells[:obstacles])
+    free = iter(cells[obstacles:])
+    for i in range(nets):
+        pins = [next(free) for _ in range(rng.randint(2, max_pins))]
+        router_input.nets.append({
+            'name': f'net{i + 1}',
+            'pins': [{'layer': layer, 'x': x, 'y': y} for layer, x, y in pins]
+        })
+    return router_input
+
+def parse_synthetic(spec: str) -> Tuple[str, int, int, int, float, int]:
+    parts = spec.split(':')
+    size, nets, pins = int(parts[0]), int(parts[1]), int(parts[2])
+    density = float(parts[3]) if len(parts) > 3 else 0.1
+    seed = int(parts[4]) if len(parts) > 4 else 1
+    return f'synthetic-{size}x{size}-{nets}', size, nets, pins, density, seed
+
+def read_expected(filename: str) -> List[Tuple[str, List[Tuple[int, int, int]]]]:
+    expected = []
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            cells = [tuple(map(int, match)) for match in re.findall(r'\((\d+),\s*(\d+),\s*(\d+)\)', line)]
+            expected.append((parts[0], cells))
+    return expected
+
+def path_cost(router: MazeRouter, path: List[Tuple[int, int, int]]) -> int:
+    cost = 0
+    for (layer, x, y), (new_layer, new_x, new_y) in zip(path, path[1:]):
+        cost += router.path_finder.move_cost(layer, new_x - x, new_y - y, new_layer)
+    return cost
+
+def check_oracle(router: MazeRouter, routing_results: Dict, expected_file: str) -> str:
+    """Compare routed nets against an expected output: same paths, same per-net costs, or neither."""
+    expected = read_expected(expected_file)
+    routed = [(name, result[0]) for name, result in routing_results.items()]
+    if routed == expected:
+        return 'exact'
+    if ([name for name, _ in routed] == [name for name, _ in expected] and
+            all(path_cost(router, path) == path_cost(router, other)
+                for (_, path), (_, other) in zip(routed, expected))):
+        return 'equal-cost'
+    return 'mismatch'
+
+def route(router_input: MazeRouterInput, args) -> Tuple[MazeRouter, Dict]:
+    router = MazeRouter(router_input, search=args.search, topology=args.topology,
+                        window_margin=args.window_margin, frontier=args.frontier, pattern=args.pattern)
+    if args.global_route is not None:
+        router.use_global_routing(global_route(router_input, args.global_route))
+    routing_results = {}
+    for net, result in router.route_nets(net_order(router_input, args.order)):
+        if result:
+            routing_results[net['name']] = result
+    return router, routing_results
+
+def peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure_case(load, args, expected_file: Optional[str], conn=None) -> Dict:
+    start_rss = peak_rss() if resource else None
+    router_input = load()
+    started = time.perf_counter()
+    router, routing_results = route(router_input, args)
+    wall_time = time.perf_counter() - started
+
+    report = {
+        'wall_time': round(wall_time, 4),
+        'nodes_expanded': router.path_finder.nodes_expanded,
+        'rejected_searches': router.rejected_searches,
+        # Growth of the process's peak RSS while loading and routing the design
+        'peak_memory': peak_rss() - start_rss if resource else None,
+        'routed_nets': len(routing_results),
+        'failed_nets': len(router_input.nets) - len(routing_results),
+        'wirelength': sum(result[1] for result in routing_results.values()),
+        'vias': sum(result[2] for result in routing_results.values()),
+    }
+    if expected_file and os.path.exists(expected_file):
+        report['oracle'] = check_oracle(router, routing_results, expected_file)
+    if conn is not None:
+        conn.send(report)
+        conn.close()
+    return report
+
+def run_case(load, args, expected_file: Optional[str] = None) -> Dict:
+    """Route one design in a forked child so its peak memory is measured on its own."""
+    if resource is None or 'fork' not in multiprocessing.get_all_start_methods():
+        return measure_case(load, args, expected_file)
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=measure_case, args=(load, args, expected_file, sender))
+    child.start()
+    sender.close()
+    try:
+        report = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"Benchmark child exited with code {child.exitcode}") from None
+    finally:
+        child.join()
+    return report
+
+def run_benchmarks(args) -> Dict:
+    cases = {}
+    names = args.cases if args.cases is not None else sorted(
+        os.listdir(TEST_CASES_DIR), key=lambda name: (len(name), name))
+    for name in names:
+        input_file = os.path.join(TEST_CASES_DIR, name, 'input.txt')
+        if not os.path.exists(input_file):
+            continue
+        cases[name] = run_case(lambda: MazeRouterInput.from_file(input_file), args,
+                               os.path.join(TEST_CASES_DIR, name, 'expected_output.txt'))
+
+    if not args.no_synthetic:
+        specs = [parse_synthetic(spec) for spec in args.synthetic] if args.synthetic else DEFAULT_SYNTHETIC
+        for name, size, nets, pins, density, seed in specs:
+            cases[name] = run_case(lambda: synthetic_input(size, nets, pins, density, seed), args)
+
+    totals = {key: sum(case[key] for case in cases.values())
+              for key in ('wall_time', 'nodes_expanded', 'rejected_searches', 'routed_nets', 'failed_nets', 'wirelength', 'vias')}
+    totals['wall_time'] = round(totals['wall_time'], 4)
+    totals['peak_memory'] = max((case['peak_memory'] or 0 for case in cases.values()), default=0)
+    return {
+        'options': {'search': args.search, 'frontier': args.frontier, 'topology': args.topology,
+                    'order': args.order, 'window_margin': args.window_margin, 'global_route': args.global_route,
+                    'pattern': args.pattern},
+        'cases': cases,
+        'totals': totals,
+    }
+
+def compare_searches(args) -> Dict:
+    """Route every case once per search mode and pick the mode expanding the fewest nodes."""
+    reports = {mode: run_benchmarks(argparse.Namespace(**{**vars(args), 'search': mode}))
+               for mode in SEARCH_MODES}
+    cases = {}
+    for name in reports[SEARCH_MODES[0]]['cases']:
+        cases[name] = {mode: {key: reports[mode]['cases'][name][key]
+                              for key in ('wall_time', 'nodes_expanded', 'wirelength', 'vias', 'failed_nets')}
+                       for mode in SEARCH_MODES}
+        cases[name]['fewest_nodes'] = min(SEARCH_MODES, key=lambda mode: cases[name][mode]['nodes_expanded'])
+    return {
+        'options': {'frontier': args.frontier, 'topology': args.topology, 'order': args.order,
+                    'window_margin': args.window_margin, 'global_route': args.global_route,
+                    'pattern': args.pattern},
+        'cases': cases,
+        'totals': {mode: reports[mode]['totals'] for mode in SEARCH_MODES},
+    }
+
+def find_regressions(report: Dict, baseline: Dict, max_slowdown: float) -> List[str]:
+    regressions = []
+    for name, case in report['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        for key in ('failed_nets', 'wirelength', 'vias', 'nodes_expanded'):
+            if case[key] > base[key]:
+                regressions.append(f"{name}: {key} rose from {base[key]} to {case[key]}")
+        if 'oracle' in case and 'oracle' in base and \
+                ORACLE_LEVELS.index(case['oracle']) > ORACLE_LEVELS.index(base['oracle']):
+            regressions.append(f"{name}: expected output match fell from {base['oracle']} to {case['oracle']}")
+        # Sub-10ms cases are too noisy to time
+        if max_slowdown > 0 and base['wall_time'] >= 0.01 and case['wall_time'] > base['wall_time'] * max_slowdown:
+            regressions.append(f"{name}: wall time {case['wall_time']}s is over {max_slowdown}x "
+                               f"the baseline {base['wall_time']}s")
+    return regressions
+
+def write_report(text: str, output: Optional[str]):
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+def main():
+    args = parse_arguments()
+    if args.compare_searches:
+        write_report(json.dumps(compare_searches(args), indent=2), args.output)
+        return
+    report = run_benchmarks(args)
+
+    text = json.dumps(report, indent=2)
+    write_report(text, args.output)
+
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text + '\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --write-baseline to create one", file=sys.stderr)
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get('options') != report['options']:
+        print("Baseline was recorded with different router options; skipping comparison", file=sys.stderr)
+        return
+    regressions = find_regressions(report, baseline, args.max_slowdown)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
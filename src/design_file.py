@@ -0,0 +1,126 @@
+import mmap
+import struct
+import sys
+import numpy as np
+from array import array
+from parser import MazeRouterInput
+
+# Compiled design layout, all little-endian and 8-byte aligned sections:
+#   header      HEADER struct below
+#   bitmap      one packed obstruction bitmap per layer, rows of y then x, MSB first
+#   net_offsets int32[nets + 1]   net i owns pins net_offsets[i]..net_offsets[i + 1] - 1
+#   pin_data    int32[pins * 3]   (layer, x, y) per pin
+#   name_ends   uint32[nets]      end of each net name in the string table
+#   names       UTF-8 string table
+MAGIC = b'MZRD'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIIiiIII')
+NUM_LAYERS = 2
+
+def aligned(size: int) -> int:
+    return (size + 7) & ~7
+
+def layer_bitmap_size(width: int, height: int) -> int:
+    return aligned((width * height + 7) // 8)
+
+def is_compiled(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def compile_design(router_input: MazeRouterInput, filename: str):
+    """Write a parsed design as a compiled binary design file."""
+    width, height = router_input.grid_width, router_input.grid_height
+    obstacle_map = np.zeros((NUM_LAYERS, height, width), dtype=np.uint8)
+    cells = np.asarray(router_input.obstructions, dtype=np.int64).reshape(-1, 3)
+    layer, x, y = cells[:, 0], cells[:, 1], cells[:, 2]
+    valid = (layer >= 1) & (layer <= NUM_LAYERS) & (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    obstacle_map[layer[valid] - 1, y[valid], x[valid]] = 1
+
+    names = [name.encode('utf-8') for name in router_input.net_names]
+    name_ends = np.cumsum([len(name) for name in names], dtype=np.uint32)
+    blob = b''.join(names)
+    pin_count = len(router_input.pin_data) // 3
+
+    def padding(size: int) -> bytes:
+        return bytes(aligned(size) - size)
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, NUM_LAYERS, width, height,
+                            router_input.via_penalty, router_input.wrong_direction_penalty,
+                            len(names), pin_count, len(blob)))
+        f.write(padding(HEADER.size))
+        for layer_map in obstacle_map:
+            bits = np.packbits(layer_map.ravel()).tobytes()
+            f.write(bits + bytes(layer_bitmap_size(width, height) - len(bits)))
+        for table in (np.asarray(router_input.net_offsets, dtype='<i4'),
+                      np.asarray(router_input.pin_data, dtype='<i4'),
+                      name_ends.astype('<u4')):
+            data = table.tobytes()
+            f.write(data + padding(len(data)))
+        f.write(blob)
+
+def int_array(buffer) -> array:
+    # array('i') copy of a little-endian int32 buffer
+    values = array('i')
+    values.frombytes(buffer)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def load_compiled(filename: str) -> MazeRouterInput:
+    """Memory-map a compiled design file.
+
+    The obstruction bitmap is unpacked straight from the mapping into
+    router_input.obstruction_map, which MazeRouter copies into its grid in one
+    pass; the pin tables are copied into the input's flat arrays with memcpy.
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename}: not a compiled design file")
+        if len(header) < HEADER.size:
+            raise ValueError(f"{filename}: truncated compiled design header")
+        (magic, version, num_layers, width, height, via_penalty, wrong_direction_penalty,
+         net_count, pin_count, names_size) = HEADER.unpack(header)
+        if version != VERSION:
+            raise ValueError(f"{filename}: compiled design version {version} is not supported (expected {VERSION})")
+        if num_layers != NUM_LAYERS:
+            raise ValueError(f"{filename}: {num_layers}-layer designs are not supported")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    bitmap_size = layer_bitmap_size(width, height)
+    offsets_at = aligned(HEADER.size) + num_layers * bitmap_size
+    pins_at = offsets_at + aligned((net_count + 1) * 4)
+    names_at = pins_at + aligned(pin_count * 12)
+    blob_at = names_at + aligned(net_count * 4)
+    if len(mapped) < blob_at + names_size:
+        mapped.close()
+        raise ValueError(f"{filename}: truncated compiled design")
+
+    router_input = MazeRouterInput(width, height, via_penalty, wrong_direction_penalty)
+    view = memoryview(mapped)
+    obstacle_map = np.empty((num_layers, height, width), dtype=np.uint8)
+    for layer in range(num_layers):
+        bits = np.frombuffer(mapped, dtype=np.uint8, count=bitmap_size,
+                             offset=aligned(HEADER.size) + layer * bitmap_size)
+        obstacle_map[layer].reshape(-1)[:] = np.unpackbits(bits, count=width * height)
+    router_input.obstruction_map = obstacle_map
+    layer, y, x = np.nonzero(obstacle_map)
+    router_input.obstructions = np.stack((layer + 1, x, y), axis=1).astype(np.intc)
+
+    router_input.net_offsets = int_array(view[offsets_at:offsets_at + (net_count + 1) * 4])
+    router_input.pin_data = int_array(view[pins_at:pins_at + pin_count * 12])
+    name_ends = np.frombuffer(mapped, dtype='<u4', count=net_count, offset=names_at).tolist()
+    blob = bytes(view[blob_at:blob_at + names_size])
+    router_input.net_names = [blob[start:end].decode('utf-8') for start, end in zip([0] + name_ends, name_ends)]
+
+    del bits
+    view.release()
+    mapped.close()
+    return router_input
+
+def load_design(filename: str) -> MazeRouterInput:
+    """Load a text or compiled design, whichever the file is."""
+    if is_compiled(filename):
+        return load_compiled(filename)
+    return MazeRouterInput.from_file(filename)
@@ -0,0 +1,177 @@
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Tuple, Dict, Set
+from parser import MazeRouterInput, parse_cells
+from router import MazeRouter, Point, SegmentPath, FREE
+
+Cell = Tuple[int, int, int]
+
+@dataclass
+class DesignDelta:
+    """Changes to a design read from an ECO delta file.
+
+    One change per line; cells use the input file's (layer, x, y) syntax:
+        +OBS (1, 5, 5)              add an obstruction
+        -OBS (2, 3, 4)              remove an obstruction
+        +net3 (1, 10, 10) ...       add pins to a net, creating it if it is new
+        -net3 (1, 2, 2) ...         remove pins from a net
+        -net4                       remove a whole net
+        ~net1 (1, 0, 0) (1, 0, 3)   move a pin from the first cell to the second
+    """
+    added_obstructions: List[Cell] = field(default_factory=list)
+    removed_obstructions: List[Cell] = field(default_factory=list)
+    added_pins: Dict[str, List[Cell]] = field(default_factory=dict)
+    removed_pins: Dict[str, List[Cell]] = field(default_factory=dict)
+    moved_pins: Dict[str, List[Tuple[Cell, Cell]]] = field(default_factory=dict)
+    removed_nets: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'DesignDelta':
+        delta = cls()
+        with open(filename, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(None, 1)
+                op, name = parts[0][0], parts[0][1:]
+                values = parse_cells(line, parts[1] if len(parts) > 1 else '')
+                cells = [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+                if op not in '+-~' or not name:
+                    raise ValueError(f"{filename}:{line_number}: expected +, - or ~ followed by OBS or a net name")
+                if name == 'OBS':
+                    if op == '~' or not cells:
+                        raise ValueError(f"{filename}:{line_number}: OBS changes take one or more cells with + or -")
+                    (delta.added_obstructions if op == '+' else delta.removed_obstructions).extend(cells)
+                elif op == '~':
+                    if not cells or len(cells) % 2:
+                        raise ValueError(f"{filename}:{line_number}: pin moves take (old) (new) cell pairs")
+                    delta.moved_pins.setdefault(name, []).extend(zip(cells[::2], cells[1::2]))
+                elif op == '+':
+                    if not cells:
+                        raise ValueError(f"{filename}:{line_number}: no pins to add to {name}")
+                    delta.added_pins.setdefault(name, []).extend(cells)
+                elif cells:
+                    delta.removed_pins.setdefault(name, []).extend(cells)
+                else:
+                    delta.removed_nets.append(name)
+        return delta
+
+    def changed_nets(self) -> Set[str]:
+        return set(self.added_pins) | set(self.removed_pins) | set(self.moved_pins) | set(self.removed_nets)
+
+    def changed_cells(self) -> Set[Cell]:
+        cells = set(self.added_obstructions) | set(self.removed_obstructions)
+        for pins in list(self.added_pins.values()) + list(self.removed_pins.values()):
+            cells.update(pins)
+        for moves in self.moved_pins.values():
+            for old, new in moves:
+                cells.update((old, new))
+        return cells
+
+@dataclass
+class EcoStats:
+    reused_nets: int
+    rerouted_nets: int
+    failed_nets: int
+
+def apply_delta(router_input: MazeRouterInput, delta: DesignDelta):
+    """Apply a delta to a parsed design in place."""
+    removed = set(delta.removed_obstructions)
+    rows = [row for row in np.asarray(router_input.obstructions, dtype=np.intc).reshape(-1, 3).tolist()
+            if tuple(row) not in removed]
+    rows.extend(delta.added_obstructions)
+    router_input.obstructions = np.array(rows, dtype=np.intc).reshape(-1, 3)
+    # A compiled design's obstruction mask no longer matches the rows
+    router_input.obstruction_map = None
+
+    nets = router_input.nets
+    for name in delta.removed_nets:
+        if name not in router_input.net_names:
+            raise ValueError(f"Cannot remove net '{name}': it is not in the design.")
+        del nets[router_input.net_names.index(name)]
+
+    edited = dict.fromkeys(list(delta.moved_pins) + list(delta.removed_pins) + list(delta.added_pins))
+    for name in edited:
+        if name in delta.removed_nets:
+            continue
+        if name in router_input.net_names:
+            index = router_input.net_names.index(name)
+            pins = [(pin['layer'], pin['x'], pin['y']) for pin in nets[index]['pins']]
+        else:
+            index, pins = len(nets), []
+        for old, new in delta.moved_pins.get(name, []):
+            if old not in pins:
+                raise ValueError(f"Cannot move pin {old} of net '{name}': the net has no such pin.")
+            pins[pins.index(old)] = new
+        for cell in delta.removed_pins.get(name, []):
+            if cell not in pins:
+                raise ValueError(f"Cannot remove pin {cell} of net '{name}': the net has no such pin.")
+            pins.remove(cell)
+        pins.extend(delta.added_pins.get(name, []))
+        net = {'name': name, 'pins': [{'layer': layer, 'x': x, 'y': y} for layer, x, y in pins]}
+        if index < len(nets):
+            nets[index] = net
+        else:
+            nets.append(net)
+
+def read_routed_output(filename: str) -> Dict[str, List[Cell]]:
+    """Read a routed output file back into net paths."""
+    paths = {}
+    with open(filename, 'r') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if len(parts) < 2:
+                continue
+            values = parse_cells(line, parts[1])
+            paths[parts[0]] = [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+    return paths
+
+def route_eco(router: MazeRouter, previous: Dict[str, List[Cell]],
+              delta: DesignDelta) -> Tuple[Dict[str, Tuple[SegmentPath, int, int]], EcoStats]:
+    """Reroute only the nets a delta affects, keeping every other previous path.
+
+    The router must be built on the design with the delta already applied. A
+    previous path is kept when its net's pins did not change, it touches no
+    changed cell, it still covers all of the net's pins and none of its cells
+    are taken. Kept paths are committed first, then the remaining nets are
+    routed around them in input order.
+    """
+    grid = router.grid
+    nets = list(router.input.nets)
+    changed_nets = delta.changed_nets()
+    changed_cells = delta.changed_cells()
+
+    kept = {}
+    for net in nets:
+        path = previous.get(net['name'])
+        if not path or net['name'] in changed_nets or not changed_cells.isdisjoint(path):
+            continue
+        net_pins = set(router.convert_to_points(net['pins']))
+        points = [Point(*cell) for cell in path]
+        if not net_pins.issubset(points) or any(
+                not grid.is_valid_point(point) or
+                (point not in net_pins and (grid.get_owner(point) != FREE or grid.is_pin(point)))
+                for point in points):
+            continue
+        router.commit_segment(points, net_pins, router.net_id(net['name']))
+        kept[net['name']] = path
+
+    routing_results = {}
+    rerouted = failed = 0
+    for net in nets:
+        name = net['name']
+        if name in kept:
+            # Chain paths are contiguous. Each tree branch starts on a cell already in the
+            # path, which may happen to be adjacent to the previous branch's end.
+            path = SegmentPath.from_cells(kept[name], split_repeats=router.topology == 'tree')
+            wire_length, vias = path.metrics()
+            routing_results[name] = (path, wire_length, vias)
+            continue
+        rerouted += 1
+        result = router.route_net(net)
+        if result:
+            routing_results[name] = result
+        else:
+            failed += 1
+    return routing_results, EcoStats(reused_nets=len(kept), rerouted_nets=rerouted, failed_nets=failed)
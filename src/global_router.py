@@ -0,0 +1,170 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from parser import MazeRouterInput
+
+# Extra cost of entering a GCell per multiple of its capacity already used
+CONGESTION_WEIGHT = 4
+
+@dataclass
+class GlobalRouting:
+    """Coarse routes of every net over a grid of gcell_size x gcell_size GCells.
+
+    capacity and usage are (rows, columns) arrays: a GCell's capacity is the
+    number of gcell_size-long wire tracks its free cells can hold, and its usage
+    the number of nets whose coarse route crosses it. corridors maps each net
+    name to the flat indices (row * columns + column) of its GCells.
+    """
+    gcell_size: int
+    capacity: np.ndarray
+    usage: np.ndarray
+    corridors: Dict[str, np.ndarray]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.capacity.shape
+
+    def corridor_mask(self, name: str) -> np.ndarray:
+        mask = np.zeros(self.shape, dtype=bool)
+        mask.flat[self.corridors[name]] = True
+        return mask
+
+    def overflow(self) -> np.ndarray:
+        # Nets each GCell holds beyond its capacity: an early estimate of where detailed routing will struggle
+        return np.maximum(self.usage - self.capacity, 0)
+
+def gcell_capacity(router_input: MazeRouterInput, gcell_size: int) -> np.ndarray:
+    """Wire tracks per GCell: its free cells over both layers, less pins, over the GCell side."""
+    width, height = router_input.grid_width, router_input.grid_height
+    rows, columns = -(-height // gcell_size), -(-width // gcell_size)
+    used = np.zeros((2, height, width), dtype=bool)
+    if router_input.obstruction_map is not None:
+        used |= router_input.obstruction_map.astype(bool)
+    else:
+        cells = np.asarray(router_input.obstructions, dtype=np.int64).reshape(-1, 3)
+        valid = ((cells[:, 0] >= 1) & (cells[:, 0] <= 2) & (cells[:, 1] >= 0) & (cells[:, 1] < width) &
+                 (cells[:, 2] >= 0) & (cells[:, 2] < height))
+        used[cells[valid, 0] - 1, cells[valid, 2], cells[valid, 1]] = True
+    pins = router_input.pin_array().astype(np.int64)
+    valid = ((pins[:, 0] >= 1) & (pins[:, 0] <= 2) & (pins[:, 1] >= 0) & (pins[:, 1] < width) &
+             (pins[:, 2] >= 0) & (pins[:, 2] < height))
+    used[pins[valid, 0] - 1, pins[valid, 2], pins[valid, 1]] = True
+
+    # Pad to whole GCells with used cells, then sum the free cells of each block
+    free = np.zeros((rows * gcell_size, columns * gcell_size), dtype=np.int64)
+    free[:height, :width] = (~used).sum(axis=0)
+    free = free.reshape(rows, gcell_size, columns, gcell_size).sum(axis=(1, 3))
+    return free // gcell_size
+
+def segment(row0: int, column0: int, row1: int, column1: int, columns: int) -> np.ndarray:
+    # Flat indices of a straight run of GCells, both ends included
+    if row0 == row1:
+        return row0 * columns + np.arange(min(column0, column1), max(column0, column1) + 1)
+    return np.arange(min(row0, row1), max(row0, row1) + 1) * columns + column0
+
+def coarse_route(pin_gcells: List[int], columns: int, cost: np.ndarray) -> np.ndarray:
+    """Connect a net's GCells into a tree of L-shapes, returning every GCell on it.
+
+    Pin GCells join the tree in Prim order, each through the cheaper of the
+    two L-shapes to its nearest connected pin GCell, where cost holds the
+    current cost of entering each GCell.
+    """
+    points = [divmod(gcell, columns) for gcell in pin_gcells]
+    connected = points[:1]
+    remaining = points[1:]
+    runs = [np.array(pin_gcells[:1])]
+    while remaining:
+        distance, point, target = min((abs(a[0] - b[0]) + abs(a[1] - b[1]), a, b)
+                                      for a in remaining for b in connected)
+        remaining.remove(point)
+        connected.append(point)
+        (row0, column0), (row1, column1) = target, point
+        # Across then along, or along then across
+        first = (segment(row0, column0, row0, column1, columns), segment(row0, column1, row1, column1, columns))
+        second = (segment(row0, column0, row1, column0, columns), segment(row1, column0, row1, column1, columns))
+        if cost[first[0]].sum() + cost[first[1]].sum() <= cost[second[0]].sum() + cost[second[1]].sum():
+            runs.extend(first)
+        else:
+            runs.extend(second)
+    return np.unique(np.concatenate(runs))
+
+def gcell_cost(usage: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    # Entering a GCell costs 1 plus CONGESTION_WEIGHT per multiple of its capacity already used
+    return 1 + CONGESTION_WEIGHT * (usage + 1) // (capacity + 1)
+
+def global_route(router_input: MazeRouterInput, gcell_size: int = 16) -> GlobalRouting:
+    """Pattern-route every net over the GCell grid in input order, accumulating usage as it goes."""
+    if gcell_size < 1:
+        raise ValueError("GCell size must be positive.")
+    capacity = gcell_capacity(router_input, gcell_size)
+    rows, columns = capacity.shape
+    flat_capacity = capacity.ravel()
+    usage = np.zeros(rows * columns, dtype=np.int64)
+    cost = gcell_cost(usage, flat_capacity)
+    pins = router_input.pin_array().astype(np.int64)
+    pin_gcells = (np.clip(pins[:, 2], 0, router_input.grid_height - 1) // gcell_size * columns +
+                  np.clip(pins[:, 1], 0, router_input.grid_width - 1) // gcell_size).tolist()
+    offsets = router_input.net_offsets
+
+    corridors = {}
+    for index, name in enumerate(router_input.net_names):
+        gcells = list(dict.fromkeys(pin_gcells[offsets[index]:offsets[index + 1]]))
+        if not gcells:
+            continue
+        route = coarse_route(gcells, columns, cost) if len(gcells) > 1 else np.array(gcells)
+        usage[route] += 1
+        cost[route] = gcell_cost(usage[route], flat_capacity[route])
+        corridors[name] = route.astype(np.intc)
+    return GlobalRouting(gcell_size=gcell_size, capacity=capacity, usage=usage.reshape(rows, columns),
+                         corridors=corridors)
+
+def dilate(mask: np.ndarray, margin: int) -> np.ndarray:
+    # Grow a GCell mask by margin GCells in every direction, diagonals included
+    grown = mask.copy()
+    for _ in range(margin):
+        step = grown.copy()
+        step[1:] |= grown[:-1]
+        step[:-1] |= grown[1:]
+        grown = step.copy()
+        grown[:, 1:] |= step[:, :-1]
+        grown[:, :-1] |= step[:, 1:]
+    return grown
+
+def corridor_fence(mask: np.ndarray, gcell_size: int, width: int, height: int,
+                   num_layers: int = 2) -> Tuple[Tuple[int, int, int, int], np.ndarray]:
+    """Search window and fence cells that confine a search to a GCell mask.
+
+    The window is the mask's bounding box in cells. Inside it, the fence is
+    the one-cell strip of every GCell outside the mask along each edge it
+    shares with a GCell in the mask, on every layer, as flat cell indices.
+    Moves are single steps, so no path leaves the mask without entering the
+    fence or the window's edge.
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    columns = np.flatnonzero(mask.any(axis=0))
+    row0, row1, column0, column1 = int(rows[0]), int(rows[-1]), int(columns[0]), int(columns[-1])
+    crop = mask[row0:row1 + 1, column0:column1 + 1]
+    window = (column0 * gcell_size, row0 * gcell_size,
+              min((column1 + 1) * gcell_size, width) - 1, min((row1 + 1) * gcell_size, height) - 1)
+    offsets = np.arange(gcell_size)
+
+    xs, ys = [], []
+    # Vertical GCell edges: a column strip in the outside GCell, spanning the GCell's rows
+    for outside, first in ((crop[:, :-1] & ~crop[:, 1:], True), (~crop[:, :-1] & crop[:, 1:], False)):
+        edge_rows, edge_columns = np.nonzero(outside)
+        x = (column0 + edge_columns + 1) * gcell_size - (0 if first else 1)
+        xs.append(np.repeat(x, gcell_size))
+        ys.append(((row0 + edge_rows)[:, None] * gcell_size + offsets).ravel())
+    # Horizontal GCell edges: a row strip in the outside GCell, spanning the GCell's columns
+    for outside, first in ((crop[:-1] & ~crop[1:], True), (~crop[:-1] & crop[1:], False)):
+        edge_rows, edge_columns = np.nonzero(outside)
+        y = (row0 + edge_rows + 1) * gcell_size - (0 if first else 1)
+        ys.append(np.repeat(y, gcell_size))
+        xs.append(((column0 + edge_columns)[:, None] * gcell_size + offsets).ravel())
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    inside = (x < width) & (y < height)
+    cells = y[inside] * width + x[inside]
+    layer_size = width * height
+    fence = (np.arange(num_layers)[:, None] * layer_size + cells).ravel()
+    return window, fence
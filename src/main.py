@@ -1,43 +1,192 @@
 import sys
 import os
+import time
 import argparse
+import cProfile
+import pstats
+import numpy as np
 from parser import MazeRouterInput
-from router import MazeRouter
-from visualization import plot_routed_nets
+from design_file import compile_design, load_design
+from router import MazeRouter, FRONTIERS, PATTERN_MODES, SEARCH_MODES, TOPOLOGIES
+from parallel import route_parallel
+from net_order import NET_ORDERS, net_order
+from eco import DesignDelta, apply_delta, read_routed_output, route_eco
+from routing_output import PLOT_STYLES, RoutingWriter, write_stats, write_table
+from global_router import global_route
+from sweep import SweepResult, penalty_grid, run_sweep, format_sweep_table
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Maze Router with configurable costs')
-    parser.add_argument('input_file', help='Input file path')
+    parser.add_argument('input_file', help='Input file path (text or compiled design)')
     parser.add_argument('output_file', help='Output file path')
     parser.add_argument('--via-penalty', type=int, default=None,
                       help='Cost penalty for vias (layer changes). If not specified, uses value from input file.')
     parser.add_argument('--wrong-direction-penalty', type=int, default=None,
                       help='Cost penalty for routing in non-preferred direction. If not specified, uses value from input file.')
-    return parser.parse_args()
+    parser.add_argument('--search', choices=SEARCH_MODES, default='astar',
+                      help='Path search algorithm (default: astar). bidirectional searches two-pin '
+                           'connections from both ends with the same path cost as astar. line-probe '
+                           'extends straight probe lines along each layer\'s preferred direction, '
+                           'falling back to astar when the probes do not meet.')
+    parser.add_argument('--frontier', choices=list(FRONTIERS), default='heap',
+                      help='Search priority queue (default: heap). bucket uses a bucket queue indexed by '
+                           'integer cost; path costs are unchanged but equal-cost ties may resolve differently.')
+    parser.add_argument('--pattern', choices=PATTERN_MODES, default='off',
+                      help='Try L- and Z-shaped routes before searching each chained two-pin connection '
+                           '(default: off). exact takes a pattern only when no search could find a cheaper '
+                           'path; fast takes the cheapest free pattern, which may cost more vias or wire.')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='chain',
+                      help='How multi-pin nets are connected: chain pins in file order, or grow a tree '
+                           'from the routed wire to the nearest unconnected pin (default: chain).')
+    parser.add_argument('--negotiated', action='store_true',
+                      help='Use negotiated-congestion rip-up and reroute instead of a single routing pass.')
+    parser.add_argument('--max-iterations', type=int, default=30,
+                      help='Iteration cap for --negotiated (default: 30).')
+    parser.add_argument('--window-margin', type=int, default=None,
+                      help='Confine each search to the bounding box of its endpoints grown by N cells, '
+                           'doubling the margin until a path is found or the whole grid is covered.')
+    parser.add_argument('--global-route', type=int, nargs='?', const=16, default=None, metavar='GCELL_SIZE',
+                      help='Route every net over a coarse grid of GCELL_SIZE x GCELL_SIZE GCells first (default: '
+                           '16), then confine its detailed searches to that corridor, widening it on failure.')
+    parser.add_argument('--corridor-margin', type=int, default=1,
+                      help='GCells added around each corridor with --global-route (default: 1).')
+    parser.add_argument('--jobs', type=int, default=1,
+                      help='Route spatially independent nets in N worker processes. The result is identical '
+                           'to the serial run (default: 1). Not used with --negotiated.')
+    parser.add_argument('--order', choices=NET_ORDERS, default='input',
+                      help='Order nets are routed in (default: input). short-first takes the smallest pin '
+                           'bounding boxes first, critical-first the nets with most pins, congestion-first '
+                           'the nets whose box is most crowded with other pins. Output stays in input order.')
+    parser.add_argument('--eco', nargs=2, metavar=('PREVIOUS_OUTPUT', 'DELTA_FILE'), default=None,
+                      help='Incremental ECO routing: apply DELTA_FILE to the input design, keep every net of '
+                           'PREVIOUS_OUTPUT the delta does not affect and reroute only the rest.')
+    parser.add_argument('--stats', metavar='FILE', default=None,
+                      help='Write per-net routing stats (wall time, nodes expanded and pushed, peak frontier, '
+                           'searches, window retries, commit time) to FILE: CSV for a .csv name, else JSON.')
+    parser.add_argument('--profile', type=int, nargs='?', const=20, default=None, metavar='N',
+                      help='Run routing under cProfile and print the N functions with the most own time '
+                           '(default: 20).')
+    parser.add_argument('--plot', choices=PLOT_STYLES + ('none',), default='auto',
+                      help='Layer view renderer: vector shapes, raster images, or auto (raster on grids over '
+                           '100x100 cells). none skips visualization; render later with visualization.py.')
+    args = parser.parse_args()
+    if any(penalty is not None and penalty < 0 for penalty in (args.via_penalty, args.wrong_direction_penalty)):
+        parser.error('penalties must be non-negative')
+    if args.global_route is not None and args.global_route < 1:
+        parser.error('--global-route GCELL_SIZE must be positive')
+    if args.corridor_margin < 0:
+        parser.error('--corridor-margin must be non-negative')
+    if args.window_margin is not None and args.window_margin < 0:
+        parser.error('--window-margin must be non-negative')
+    if args.jobs < 1:
+        parser.error('--jobs must be positive')
+    if args.eco and (args.negotiated or args.jobs > 1):
+        parser.error('--eco cannot be combined with --negotiated or --jobs')
+    if args.stats and (args.negotiated or args.jobs > 1):
+        parser.error('--stats cannot be combined with --negotiated or --jobs')
+    if args.global_route is not None and (args.negotiated or args.jobs > 1):
+        parser.error('--global-route cannot be combined with --negotiated or --jobs')
+    if args.order != 'input' and (args.eco or args.negotiated):
+        parser.error('--order cannot be combined with --eco or --negotiated')
+    return args
+
+def parse_compile_arguments(argv):
+    parser = argparse.ArgumentParser(prog='main.py compile',
+                                     description='Compile a text design into a binary design file')
+    parser.add_argument('input_file', help='Text input file path')
+    parser.add_argument('output_file', help='Compiled design file path')
+    return parser.parse_args(argv)
+
+def compile_main(argv):
+    args = parse_compile_arguments(argv)
+    router_input = MazeRouterInput.from_file(args.input_file)
+    compile_design(router_input, args.output_file)
+    print(f"Compiled {len(router_input.net_names)} nets and {len(router_input.obstructions)} obstructions "
+          f"into {args.output_file}")
+
+def parse_sweep_arguments(argv):
+    parser = argparse.ArgumentParser(prog='main.py sweep',
+                                     description='Route one design under every pair of via and wrong-direction '
+                                                 'penalties and compare the results')
+    parser.add_argument('input_file', help='Input file path (text or compiled design)')
+    parser.add_argument('--via-penalties', type=int, nargs='+', required=True, metavar='N',
+                      help='Via penalties to sweep.')
+    parser.add_argument('--wrong-direction-penalties', type=int, nargs='+', required=True, metavar='N',
+                      help='Wrong-direction penalties to sweep; every pair with --via-penalties is routed.')
+    parser.add_argument('--jobs', type=int, default=None,
+                      help='Worker processes routing settings concurrently (default: one per CPU, at most '
+                           'one per setting).')
+    parser.add_argument('--table', metavar='FILE', default=None,
+                      help='Also write the results table to FILE: CSV for a .csv name, else JSON.')
+    parser.add_argument('--output-dir', default=None,
+                      help='Write each setting\'s routed output to OUTPUT_DIR/via<V>_wrong<W>.txt.')
+    parser.add_argument('--plot', choices=PLOT_STYLES, default=None,
+                      help='Also render each setting\'s layer views into OUTPUT_DIR/via<V>_wrong<W>/.')
+    parser.add_argument('--search', choices=SEARCH_MODES, default='astar', help='Path search algorithm.')
+    parser.add_argument('--frontier', choices=list(FRONTIERS), default='heap', help='Search priority queue.')
+    parser.add_argument('--pattern', choices=PATTERN_MODES, default='off',
+                      help='L/Z pattern routes tried before two-pin searches.')
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='chain', help='How multi-pin nets are connected.')
+    parser.add_argument('--window-margin', type=int, default=None, help='Initial search window margin.')
+    parser.add_argument('--order', choices=NET_ORDERS, default='input', help='Order nets are routed in.')
+    args = parser.parse_args(argv)
+    if args.plot and not args.output_dir:
+        parser.error('--plot requires --output-dir')
+    if any(penalty < 0 for penalty in args.via_penalties + args.wrong_direction_penalties):
+        parser.error('penalties must be non-negative')
+    if args.window_margin is not None and args.window_margin < 0:
+        parser.error('--window-margin must be non-negative')
+    return args
+
+def sweep_main(argv):
+    args = parse_sweep_arguments(argv)
+    router_input = load_design(args.input_file)
+    router = MazeRouter(router_input, search=args.search, topology=args.topology,
+                        window_margin=args.window_margin, frontier=args.frontier, pattern=args.pattern)
+    settings = penalty_grid(args.via_penalties, args.wrong_direction_penalties)
+    jobs = args.jobs or min(len(settings), os.cpu_count() or 1)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Sweeping {len(settings)} penalty settings over {len(router_input.net_names)} nets with {jobs} workers\n")
+    results = run_sweep(router, settings, jobs, order=net_order(router_input, args.order),
+                        output_dir=args.output_dir, plot=args.plot)
+    print(format_sweep_table(results))
+    print("\n* Pareto front: no other setting is as good on failed nets, wire length and vias and better on one")
+    if args.table:
+        write_table(results, SweepResult, args.table, 'settings')
+        print(f"Sweep table written to {args.table}")
 
 def write_routing_results(output_file: str, routing_results: dict):
-    with open(output_file, 'w') as f:
+    with RoutingWriter(output_file) as writer:
         for net_name, result in routing_results.items():
-            if result:
-                path, wire_length, via_count = result
-                path_str = ' '.join(f"({layer}, {x}, {y})" for layer, x, y in path)
-                f.write(f"{net_name} {path_str}\n")
-                print(f"Successfully routed {net_name}")
-                print(f"Wire length: {wire_length}, Vias: {via_count}")
-            else:
-                print(f"Warning: Could not route {net_name}")
+            writer.write(net_name, result)
 
 def main():
+    if sys.argv[1:2] == ['compile']:
+        compile_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['sweep']:
+        sweep_main(sys.argv[2:])
+        return
+
     args = parse_arguments()
 
     # Parse input file and create router input
-    router_input = MazeRouterInput.from_file(args.input_file)
+    router_input = load_design(args.input_file)
+    if args.eco:
+        delta = DesignDelta.from_file(args.eco[1])
+        apply_delta(router_input, delta)
 
     # Create router with optional penalty overrides
     router = MazeRouter(
         router_input,
         via_penalty=args.via_penalty,
-        wrong_direction_penalty=args.wrong_direction_penalty
+        wrong_direction_penalty=args.wrong_direction_penalty,
+        search=args.search,
+        topology=args.topology,
+        window_margin=args.window_margin,
+        frontier=args.frontier,
+        pattern=args.pattern
     )
     
     # Print penalty values being used
@@ -45,19 +194,73 @@ def main():
     print(f"Via penalty: {router.via_penalty}")
     print(f"Wrong direction penalty: {router.wrong_direction_penalty}\n")
     
-    routing_results = {}
-    for net in router_input.nets:
-        result = router.route_net(net)
-        if result:
-            routing_results[net['name']] = result
-
-    # Write output file
-    write_routing_results(args.output_file, routing_results)
-    
-    # Generate visualizations
-    output_dir = os.path.dirname(args.output_file)
-    plot_routed_nets(routing_results, router_input, output_dir)
-    print(f"\nVisualizations saved in {output_dir}")
+    if args.global_route is not None:
+        started = time.perf_counter()
+        global_routing = global_route(router_input, args.global_route)
+        overflow = global_routing.overflow()
+        rows, columns = global_routing.shape
+        print(f"Global routing: {rows}x{columns} GCells of {args.global_route} cells, "
+              f"{int(np.count_nonzero(overflow))} over capacity (total overflow {int(overflow.sum())}), "
+              f"{time.perf_counter() - started:.2f}s\n")
+        router.use_global_routing(global_routing, args.corridor_margin)
+    if args.stats:
+        router.enable_stats()
+    profiler = cProfile.Profile() if args.profile is not None else None
+    if profiler:
+        profiler.enable()
+
+    if args.eco:
+        routing_results, eco_stats = route_eco(router, read_routed_output(args.eco[0]), delta)
+        print(f"ECO: {eco_stats.reused_nets} nets reused, {eco_stats.rerouted_nets} rerouted "
+              f"({eco_stats.failed_nets} failed)\n")
+    elif args.negotiated:
+        routing_results, iteration_stats = router.route_negotiated(max_iterations=args.max_iterations)
+        print("Negotiated congestion:")
+        for stats in iteration_stats:
+            print(f"  Iteration {stats.iteration}: {stats.overused_cells} overused cells, "
+                  f"{stats.rerouted_nets} nets rerouted, {stats.failed_nets} failed, {stats.wall_time:.3f}s")
+        print()
+    elif args.jobs > 1:
+        routing_results = route_parallel(router, args.jobs, order=net_order(router_input, args.order))
+    else:
+        # Stream each net to the output file as soon as it is routed; results are
+        # only kept for the plot
+        routing_results = None if args.plot == 'none' else {}
+        with RoutingWriter(args.output_file) as writer:
+            for net, result in router.route_nets(net_order(router_input, args.order)):
+                if result:
+                    writer.write(net['name'], result)
+                    if routing_results is not None:
+                        routing_results[net['name']] = result
+    if profiler:
+        profiler.disable()
+
+    # The plot renders in a worker process while the output is written
+    if args.plot != 'none':
+        # matplotlib is only imported when a plot is asked for
+        from visualization import plot_in_background
+        plot_in_background(routing_results, router_input, os.path.dirname(args.output_file), args.plot)
+    if args.eco or args.negotiated or args.jobs > 1:
+        write_routing_results(args.output_file, routing_results)
+    print(f"\nNodes expanded ({args.search}): {router.path_finder.nodes_expanded}")
+    print(f"Searches rejected as unroutable by connectivity: {router.rejected_searches}")
+    if args.search == 'line-probe':
+        print(f"Line probes: {router.path_finder.probe_hits} met, {router.path_finder.probe_misses} fell back to A*")
+    if args.pattern != 'off':
+        path_finder = router.path_finder
+        tried = path_finder.pattern_hits + path_finder.pattern_misses
+        print(f"Pattern routes: {path_finder.pattern_hits} of {tried} two-pin connections "
+              f"({100 * path_finder.pattern_hits / max(tried, 1):.1f}%), the rest searched")
+    if args.global_route is not None:
+        print(f"Corridors: {router.path_finder.corridor_hits} hits, {router.path_finder.corridor_misses} widened")
+    if args.window_margin is not None:
+        print(f"Search windows: {router.path_finder.window_hits} hits, {router.path_finder.window_misses} misses")
+    if args.stats:
+        write_stats(router.net_stats, args.stats)
+        print(f"Stats for {len(router.net_stats)} nets written to {args.stats}")
+    if profiler:
+        print(f"\nTop {args.profile} functions by own time:")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats('tottime').print_stats(args.profile)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Tuple, Optional, Dict
+from router import MazeRouter, Point, SegmentPath
+
+# Per-process router used by pool workers, built once by init_worker
+_worker: Optional[Tuple[MazeRouter, shared_memory.SharedMemory]] = None
+
+def net_bounds(net: Dict, margin: int) -> Tuple[int, int, int, int]:
+    """Bounding box (x0, y0, x1, y1) of a net's pins grown by margin."""
+    xs = [pin['x'] for pin in net['pins']]
+    ys = [pin['y'] for pin in net['pins']]
+    return min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin
+
+def boxes_overlap(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+def next_wave(nets: List[Dict], start: int, limit: int, margin: int) -> int:
+    """Return the end of the longest run of nets from start with pairwise disjoint boxes."""
+    boxes = []
+    end = start
+    while end < len(nets) and end - start < limit:
+        box = net_bounds(nets[end], margin)
+        if any(boxes_overlap(box, other) for other in boxes):
+            break
+        boxes.append(box)
+        end += 1
+    return max(end, start + 1)
+
+# Search counters a worker reports back for each net, read from the path finder
+# except rejected_searches, which the router keeps
+COUNTERS = ('nodes_expanded', 'window_hits', 'window_misses', 'rejected_searches',
+            'probe_hits', 'probe_misses', 'pattern_hits', 'pattern_misses')
+
+def counter_owner(router: MazeRouter, name: str):
+    return router if name == 'rejected_searches' else router.path_finder
+
+def read_counters(router: MazeRouter) -> Dict[str, int]:
+    return {name: getattr(counter_owner(router, name), name) for name in COUNTERS}
+
+def add_counters(router: MazeRouter, deltas: Dict[str, int]):
+    for name, delta in deltas.items():
+        owner = counter_owner(router, name)
+        setattr(owner, name, getattr(owner, name) + delta)
+
+def init_worker(router_input, via_penalty: int, wrong_direction_penalty: int, search: str, topology: str,
+                window_margin: Optional[int], frontier: str, pattern: str, shm_name: str):
+    global _worker
+    router = MazeRouter(router_input, via_penalty, wrong_direction_penalty, search, topology, window_margin, frontier,
+                        pattern=pattern)
+    router.path_finder.touched_log = []
+    router.commit_log = []
+    # The grid is reset to each snapshot, so committed cells may be free again later
+    router.connectivity.track_commits = False
+    _worker = (router, shared_memory.SharedMemory(name=shm_name))
+
+def route_speculative(net: Dict) -> Tuple[Optional[List[List[Tuple[int, int, int]]]], bytes, bytes, Dict[str, int]]:
+    """Route one net against the current grid snapshot in a worker process.
+
+    Returns the path segments (None on failure), the cells the net committed,
+    the cells its searches reached, and how much it added to each of COUNTERS.
+    """
+    router, shm = _worker
+    grid = router.grid
+    path_finder = router.path_finder
+    grid.blocked[:] = shm.buf[:grid.size]
+    path_finder.touched_log.clear()
+    router.commit_log.clear()
+    before = read_counters(router)
+
+    segments = router.route_segments(net)
+    if segments is not None:
+        segments = [[point.to_tuple() for point in segment] for segment in segments]
+    after = read_counters(router)
+    return (segments,
+            np.array(router.commit_log, dtype=np.intc).tobytes(),
+            np.array(path_finder.touched_log, dtype=np.intc).tobytes(),
+            {name: after[name] - before[name] for name in COUNTERS})
+
+def route_parallel(router: MazeRouter, jobs: int, margin: int = 4, wave_size: Optional[int] = None,
+                   order: Optional[List[int]] = None) -> Dict[str, Tuple[SegmentPath, int, int]]:
+    """Route every net across a process pool with the same result as a serial run.
+
+    Nets are taken in input order in waves whose pin boxes (plus margin) are
+    pairwise disjoint. Each wave is routed concurrently against a shared
+    read-only snapshot of the grid, then committed in order. A net's result is
+    only kept if none of the cells its search reached were claimed by an earlier
+    net of the same wave; otherwise it is rerouted serially, so the output is
+    identical to routing the nets one at a time. order lists net indices to
+    route in place of input order; results are still returned in input order.
+    """
+    grid = router.grid
+    nets = router.input.nets
+    if order is not None:
+        nets = [nets[index] for index in order]
+    wave_size = wave_size or jobs * 4
+    routing_results = {}
+
+    shm = shared_memory.SharedMemory(create=True, size=max(grid.size, 1))
+    # Cells claimed so far by the wave being committed
+    dirty = np.zeros(grid.size, dtype=bool)
+    router.commit_log = []
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(router.input, router.via_penalty, router.wrong_direction_penalty,
+                                           router.path_finder.search, router.topology,
+                                           router.path_finder.window_margin, router.path_finder.frontier,
+                                           router.path_finder.pattern, shm.name)) as pool:
+            start = 0
+            while start < len(nets):
+                end = next_wave(nets, start, wave_size, margin)
+                shm.buf[:grid.size] = grid.blocked
+                wave = list(pool.map(route_speculative, nets[start:end]))
+
+                for net, (segments, committed, touched, counters) in zip(nets[start:end], wave):
+                    touched = np.frombuffer(touched, dtype=np.intc)
+                    if dirty[touched].any():
+                        # An earlier net in this wave changed cells this search saw
+                        router.commit_log.clear()
+                        result = router.route_net(net)
+                        committed = np.array(router.commit_log, dtype=np.intc)
+                    else:
+                        add_counters(router, counters)
+                        committed = np.frombuffer(committed, dtype=np.intc)
+                        net_id = router.net_id(net['name'])
+                        for index in committed.tolist():
+                            grid.owner[index] = net_id
+                            grid.blocked[index] = 1
+                        result = None
+                        if segments is not None:
+                            result = router.build_result([[Point(*cell) for cell in segment] for segment in segments])
+                    dirty[committed] = True
+                    if result:
+                        routing_results[net['name']] = result
+
+                dirty[:] = False
+                start = end
+    finally:
+        router.commit_log = None
+        shm.close()
+        shm.unlink()
+    if order is not None:
+        routing_results = {net['name']: routing_results[net['name']]
+                           for net in router.input.nets if net['name'] in routing_results}
+    return routing_results
@@ -1,52 +1,163 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterable, Optional
+from array import array
+from collections.abc import MutableSequence
+import numpy as np
 import re
 
+PIN_PATTERN = re.compile(r'\((\d+),\s*(\d+),\s*(\d+)\)')
+# Text made only of well-formed cells, which PIN_PATTERN would read in full
+CELLS_PATTERN = re.compile(r'\s*(?:\(\d+,\s*\d+,\s*\d+\)\s*)*')
+
+def parse_cells(line: str, text: str) -> List[int]:
+    """Return the flat (layer, x, y, ...) integers of a line's cells.
+
+    Text made only of (L, X, Y) cells takes the fast path, which splits on
+    punctuation; anything else falls back to the regular expression, which
+    skips malformed cells.
+    """
+    if CELLS_PATTERN.fullmatch(text):
+        return list(map(int, text.replace('(', ' ').replace(')', ' ').replace(',', ' ').split()))
+    return [int(value) for match in PIN_PATTERN.findall(line) for value in match]
+
+class NetList(MutableSequence):
+    """List-like view of the nets stored in a MazeRouterInput's flat pin arrays.
+
+    Each access builds a fresh {'name', 'pins'} dict, so editing a returned dict
+    does not change the design; assign, append or delete through the list instead.
+    """
+
+    def __init__(self, router_input: 'MazeRouterInput'):
+        self.input = router_input
+
+    def __len__(self) -> int:
+        return len(self.input.net_names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        router_input = self.input
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('net index out of range')
+        name = router_input.net_names[index]
+        start, end = router_input.net_offsets[index], router_input.net_offsets[index + 1]
+        pin_data = router_input.pin_data
+        return {
+            'name': name,
+            'pins': [{'layer': pin_data[i], 'x': pin_data[i + 1], 'y': pin_data[i + 2]}
+                     for i in range(start * 3, end * 3, 3)]
+        }
+
+    def __setitem__(self, index, net: Dict):
+        del self[index]
+        self.insert(index if index >= 0 else index + len(self) + 1, net)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(len(self))), reverse=True):
+                del self[i]
+            return
+        router_input = self.input
+        if index < 0:
+            index += len(self)
+        start, end = router_input.net_offsets[index], router_input.net_offsets[index + 1]
+        del router_input.pin_data[start * 3:end * 3]
+        del router_input.net_names[index]
+        del router_input.net_offsets[index + 1]
+        for i in range(index + 1, len(router_input.net_offsets)):
+            router_input.net_offsets[i] -= end - start
+
+    def insert(self, index: int, net: Dict):
+        router_input = self.input
+        index = max(0, min(index if index >= 0 else index + len(self), len(self)))
+        values = [value for pin in net['pins'] for value in (pin['layer'], pin['x'], pin['y'])]
+        if index == len(self):
+            router_input.append_net(net['name'], values)
+            return
+        start = router_input.net_offsets[index]
+        router_input.pin_data[start * 3:start * 3] = array('i', values)
+        router_input.net_names.insert(index, net['name'])
+        router_input.net_offsets.insert(index + 1, start + len(values) // 3)
+        for i in range(index + 2, len(router_input.net_offsets)):
+            router_input.net_offsets[i] += len(values) // 3
+
 class MazeRouterInput:
     def __init__(self, grid_width: int, grid_height: int, via_penalty: int, wrong_direction_penalty: int):
         self.grid_width = grid_width
         self.grid_height = grid_height
         self.via_penalty = via_penalty
         self.wrong_direction_penalty = wrong_direction_penalty
-        self.nets: List[Dict] = []
-        self.obstructions: List[Tuple[int, int, int]] = []
+        # Nets are stored flat: net i owns pins net_offsets[i] to net_offsets[i + 1] - 1,
+        # and pin p is pin_data[3 * p:3 * p + 3] = (layer, x, y)
+        self.net_names: List[str] = []
+        self.net_offsets = array('i', [0])
+        self.pin_data = array('i')
+        self.obstructions = np.empty((0, 3), dtype=np.intc)
+        # (layer, y, x) obstruction mask set by compiled-design loading; when present
+        # the router loads it instead of the obstructions rows
+        self.obstruction_map: Optional[np.ndarray] = None
+
+    @property
+    def nets(self) -> NetList:
+        return NetList(self)
+
+    @nets.setter
+    def nets(self, nets: Iterable[Dict]):
+        self.net_names = []
+        self.net_offsets = array('i', [0])
+        self.pin_data = array('i')
+        self.nets.extend(nets)
+
+    def append_net(self, name: str, values: Iterable[int]):
+        self.pin_data.extend(values)
+        self.net_names.append(name)
+        self.net_offsets.append(len(self.pin_data) // 3)
+
+    def pin_array(self) -> np.ndarray:
+        # (pins, 3) copy of every pin as (layer, x, y)
+        return np.array(self.pin_data, dtype=np.intc).reshape(-1, 3)
+
+    def net_pins(self, index: int) -> List[Tuple[int, int, int]]:
+        start, end = self.net_offsets[index], self.net_offsets[index + 1]
+        pin_data = self.pin_data
+        return [(pin_data[i], pin_data[i + 1], pin_data[i + 2]) for i in range(start * 3, end * 3, 3)]
 
     @classmethod
     def from_file(cls, filename: str) -> 'MazeRouterInput':
         with open(filename, 'r') as f:
-            lines = f.readlines()
+            return cls.from_lines(f)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> 'MazeRouterInput':
+        lines = iter(lines)
 
         # Parse first line: grid dimensions and costs
-        dimensions = list(map(int, lines[0].strip().split(',')))
+        dimensions = list(map(int, next(lines).strip().split(',')))
         width, height = dimensions[0], dimensions[1]
         via_penalty = dimensions[2]
         wrong_direction_penalty = dimensions[3]
 
         router_input = cls(width, height, via_penalty, wrong_direction_penalty)
+        obstructions = array('i')
 
-        for line in lines[1:]:
+        for line in lines:
             line = line.strip()
             if not line or line.startswith('#'):
                 continue
 
             if line.startswith('OBS'):
                 # Parse obstacle format: OBS (layer, x, y)
-                obs_match = re.findall(r'\((\d+),\s*(\d+),\s*(\d+)\)', line)
-                if obs_match:
-                    layer, x, y = map(int, obs_match[0])
-                    router_input.obstructions.append((layer, x, y))
+                values = parse_cells(line, line[3:])
+                if len(values) >= 3:
+                    obstructions.extend(values[:3])
             else:
                 # Parse net format: netN (layer1, x1, y1) (layer2, x2, y2) ...
-                parts = line.split()
+                parts = line.split(None, 1)
                 net_name = parts[0]
-                pins = []
-                pin_matches = re.findall(r'\((\d+),\s*(\d+),\s*(\d+)\)', line)
-                for match in pin_matches:
-                    layer, x, y = map(int, match)
-                    pins.append({'layer': layer, 'x': x, 'y': y})
-                if pins:
-                    router_input.nets.append({
-                        'name': net_name,
-                        'pins': pins
-                    })
-
-        return router_input 
\ No newline at end of file
+                values = parse_cells(line, parts[1] if len(parts) > 1 else '')
+                if values:
+                    router_input.append_net(net_name, values)
+
+        router_input.obstructions = np.array(obstructions, dtype=np.intc).reshape(-1, 3)
+        return router_input
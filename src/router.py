@@ -1,11 +1,20 @@
 import numpy as np
+from array import array
 from collections import deque
+from collections.abc import Sequence
+from bisect import bisect_right
+from itertools import repeat
 import sys
 import re
 import heapq
+import operator
+from functools import partial
+import time
 from typing import List, Tuple, Optional, Dict, Set
 from dataclasses import dataclass
 from parser import MazeRouterInput
+from net_order import net_order
+from global_router import GlobalRouting, corridor_fence, dilate
 
 @dataclass
 class Point:
@@ -29,161 +38,1566 @@ class Point:
     def to_tuple(self):
         return (self.layer, self.x, self.y)
 
+# (layer, x, y) step of each SegmentPath run direction; 0 marks a single-cell run
+RUN_STEPS = ((0, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1), (1, 0, 0), (-1, 0, 0))
+RUN_DIRECTIONS = {step: direction for direction, step in enumerate(RUN_STEPS) if direction}
+RUN_FIELDS = 6  # layer, x, y, direction, length, joined
+
+def run_axis(start: int, step: int, length: int):
+    return range(start, start + step * length, step) if step else repeat(start, length)
+
+class SegmentPath(Sequence):
+    """A routed path stored as straight runs of cells instead of one tuple per cell.
+
+    runs holds flat (layer, x, y, direction, length, joined) records: length
+    cells from (layer, x, y) stepping by RUN_STEPS[direction]. joined is 1 when
+    the run's first cell is one move on from the previous run's last cell; a
+    tree branch restarting on a cell already in the path is not joined. Cells
+    expand to (layer, x, y) tuples on demand, so a SegmentPath compares equal to
+    the list of cells it holds and can be used wherever one is expected.
+    """
+
+    def __init__(self):
+        self.runs = array('i')
+        self.starts: List[int] = []  # Path index of each run's first cell
+        self.size = 0
+
+    @classmethod
+    def from_segments(cls, segments: List[List[Point]]) -> 'SegmentPath':
+        # A search segment starting on the previous segment's end continues it;
+        # any other start (a tree branch) begins a new, unjoined run
+        path = cls()
+        last = None
+        for segment in segments:
+            for index, point in enumerate(segment):
+                cell = (point.layer, point.x, point.y)
+                if index == 0:
+                    if cell == last:
+                        continue
+                    path.add(cell, False)
+                else:
+                    path.add(cell, True)
+                last = cell
+        return path
+
+    @classmethod
+    def from_cells(cls, cells, split_repeats: bool = False) -> 'SegmentPath':
+        # Adjacent cells are joined unless split_repeats is set and the cell was
+        # already visited, which is how tree branches appear in output files
+        path = cls()
+        seen = set()
+        last = None
+        for cell in cells:
+            cell = tuple(cell)
+            joined = last is not None and abs(cell[0] - last[0]) + abs(cell[1] - last[1]) + abs(cell[2] - last[2]) == 1
+            if split_repeats:
+                joined = joined and cell not in seen
+                seen.add(cell)
+            path.add(cell, joined)
+            last = cell
+        return path
+
+    def add(self, cell: Tuple[int, int, int], joined: bool):
+        runs = self.runs
+        if joined and runs:
+            base = len(runs) - RUN_FIELDS
+            direction, length = runs[base + 3], runs[base + 4]
+            dl, dx, dy = RUN_STEPS[direction]
+            step = (cell[0] - runs[base] - dl * (length - 1), cell[1] - runs[base + 1] - dx * (length - 1),
+                    cell[2] - runs[base + 2] - dy * (length - 1))
+            if length == 1 and step in RUN_DIRECTIONS:
+                runs[base + 3] = RUN_DIRECTIONS[step]
+                direction = runs[base + 3]
+            if direction and step == RUN_STEPS[direction]:
+                runs[base + 4] = length + 1
+                self.size += 1
+                return
+        self.starts.append(self.size)
+        runs.extend((cell[0], cell[1], cell[2], 0, 1, 1 if joined and runs else 0))
+        self.size += 1
+
+    def iter_runs(self):
+        """Yield (first cell, last cell, joined) for every run."""
+        runs = self.runs
+        for base in range(0, len(runs), RUN_FIELDS):
+            layer, x, y, direction, length, joined = runs[base:base + RUN_FIELDS]
+            dl, dx, dy = RUN_STEPS[direction]
+            yield ((layer, x, y), (layer + dl * (length - 1), x + dx * (length - 1), y + dy * (length - 1)),
+                   bool(joined))
+
+    def metrics(self) -> Tuple[int, int]:
+        """Wire length and via count, in O(runs)."""
+        wire_length = 0
+        vias = 0
+        last = None
+        for first, end, joined in self.iter_runs():
+            if joined:
+                wire_length += abs(first[1] - last[1]) + abs(first[2] - last[2])
+                if first[0] != last[0]:
+                    vias += 1
+            wire_length += abs(end[1] - first[1]) + abs(end[2] - first[2])
+            vias += abs(end[0] - first[0])
+            last = end
+        return wire_length, vias
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        runs = self.runs
+        for base in range(0, len(runs), RUN_FIELDS):
+            layer, x, y, direction, length, _ = runs[base:base + RUN_FIELDS]
+            dl, dx, dy = RUN_STEPS[direction]
+            yield from zip(run_axis(layer, dl, length), run_axis(x, dx, length), run_axis(y, dy, length))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError('path index out of range')
+        run = bisect_right(self.starts, index) - 1
+        layer, x, y, direction = self.runs[run * RUN_FIELDS:run * RUN_FIELDS + 4]
+        offset = index - self.starts[run]
+        dl, dx, dy = RUN_STEPS[direction]
+        return (layer + dl * offset, x + dx * offset, y + dy * offset)
+
+    def __eq__(self, other):
+        if isinstance(other, SegmentPath):
+            return self.runs == other.runs or list(self) == list(other)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"SegmentPath({list(self)!r})"
+
+# Cell owner values; routed cells hold the owning net's id (> 0)
+FREE = 0
+OBSTRUCTION = -1
+
+# Cap on the present-congestion multiplier so cell costs stay within int32
+MAX_PRESENT_FACTOR = 1 << 12
+
+@dataclass
+class IterationStats:
+    iteration: int
+    overused_cells: int
+    rerouted_nets: int
+    failed_nets: int
+    wall_time: float
+
+@dataclass
+class SearchStats:
+    # Filled in by PathFinder while instrumentation is enabled
+    searches: int = 0
+    nodes_pushed: int = 0
+    peak_frontier: int = 0
+
+@dataclass
+class NetStats:
+    name: str
+    routed: bool
+    wall_time: float
+    commit_time: float
+    nodes_expanded: int
+    nodes_pushed: int
+    peak_frontier: int  # Most entries queued at once in any of the net's searches
+    searches: int
+    window_retries: int
+    rejected_searches: int
+    wire_length: int
+    vias: int
+
+def count_frontier(frontier, stats: SearchStats, size: int):
+    # Wrap a frontier's push and pop to count pushes and track its peak size
+    push, pop = frontier.push, frontier.pop
+    stats.nodes_pushed += size
+    stats.peak_frontier = max(stats.peak_frontier, size)
+
+    def counted_push(entry: int):
+        nonlocal size
+        push(entry)
+        size += 1
+        stats.nodes_pushed += 1
+        if size > stats.peak_frontier:
+            stats.peak_frontier = size
+
+    def counted_pop() -> int:
+        nonlocal size
+        entry = pop()
+        size -= 1
+        return entry
+
+    frontier.push, frontier.pop = counted_push, counted_pop
+
 class Grid:
     def __init__(self, width: int, height: int, num_layers: int = 2):
         self.width = width
         self.height = height
-        self.num_layers = num_layers + 1  
-        self.grid = [
-            [
-                [{'obstacle': False, 'cost': 0} for _ in range(width)]
-                for _ in range(height)
-            ] for _ in range(self.num_layers)
-        ]
+        self.num_layers = num_layers
+        self.layer_size = width * height
+        self.size = num_layers * self.layer_size
+
+        # Flat cell state indexed by ((layer - 1) * height + y) * width + x
+        self.blocked = bytearray(self.size)
+        self.owner = array('i', bytes(self.size * 4))
+        # Number of nets with a pin on each cell
+        self.pin_refs = array('i', bytes(self.size * 4))
+
+        # Zero-copy NumPy views of the same memory, shaped (layer, y, x)
+        shape = (num_layers, height, width)
+        self.blocked_map = np.frombuffer(self.blocked, dtype=np.uint8).reshape(shape)
+        self.owner_map = np.frombuffer(self.owner, dtype=np.intc).reshape(shape)
+        self.pin_refs_map = np.frombuffer(self.pin_refs, dtype=np.intc).reshape(shape)
+
+        # Negotiated-congestion state, allocated by enable_congestion()
+        self.cost = None
+        self.usage = None
+        self.history = None
+
+    def copy(self) -> 'Grid':
+        # Independent copy of the cell state, without any congestion state
+        grid = Grid(self.width, self.height, self.num_layers)
+        grid.blocked[:] = self.blocked
+        grid.owner[:] = self.owner
+        grid.pin_refs[:] = self.pin_refs
+        return grid
+
+    def enable_congestion(self):
+        # cost = history + present_factor * usage is added to every move into a cell
+        shape = (self.num_layers, self.height, self.width)
+        self.cost = array('i', bytes(self.size * 4))
+        self.usage = array('i', bytes(self.size * 4))
+        self.history = array('i', bytes(self.size * 4))
+        self.cost_map = np.frombuffer(self.cost, dtype=np.intc).reshape(shape)
+        self.usage_map = np.frombuffer(self.usage, dtype=np.intc).reshape(shape)
+        self.history_map = np.frombuffer(self.history, dtype=np.intc).reshape(shape)
+        self.present_factor = 1
+
+    def disable_congestion(self):
+        self.cost = self.usage = self.history = None
+        self.cost_map = self.usage_map = self.history_map = None
+
+    def add_usage(self, indices: List[int], delta: int):
+        for index in indices:
+            usage = self.usage[index] + delta
+            self.usage[index] = usage
+            self.cost[index] = self.history[index] + self.present_factor * usage
+
+    def update_congestion(self, present_factor: int, history_increment: int) -> int:
+        # Charge history on overused cells, reprice every cell at the new present
+        # factor and return the number of overused cells
+        overused = self.usage_map > 1
+        self.history_map[overused] += history_increment
+        self.present_factor = present_factor
+        self.cost_map[...] = self.history_map + present_factor * self.usage_map
+        return int(np.count_nonzero(overused))
+
+    def index(self, point: Point) -> int:
+        return ((point.layer - 1) * self.height + point.y) * self.width + point.x
+
+    def point_at(self, index: int) -> Point:
+        layer, rest = divmod(index, self.layer_size)
+        y, x = divmod(rest, self.width)
+        return Point(layer + 1, x, y)
 
     def is_valid_point(self, point: Point) -> bool:
-        return (1 <= point.layer <= self.num_layers - 1 and
+        return (1 <= point.layer <= self.num_layers and
                 0 <= point.x < self.width and
                 0 <= point.y < self.height)
 
     def is_obstacle(self, point: Point) -> bool:
         if not self.is_valid_point(point):
             return True
-        return self.grid[point.layer][point.y][point.x]['obstacle']
+        return self.blocked[self.index(point)] != 0
 
     def set_obstacle(self, point: Point, is_obstacle: bool = True):
+        self.set_owner(point, OBSTRUCTION if is_obstacle else FREE)
+
+    def set_owner(self, point: Point, owner: int):
+        if self.is_valid_point(point):
+            index = self.index(point)
+            self.owner[index] = owner
+            self.blocked[index] = owner != FREE
+
+    def get_owner(self, point: Point) -> int:
+        if not self.is_valid_point(point):
+            return OBSTRUCTION
+        return self.owner[self.index(point)]
+
+    def add_pin(self, point: Point):
+        if self.is_valid_point(point):
+            self.pin_refs[self.index(point)] += 1
+
+    def remove_pin(self, point: Point):
         if self.is_valid_point(point):
-            self.grid[point.layer][point.y][point.x]['obstacle'] = is_obstacle
+            self.pin_refs[self.index(point)] -= 1
+
+    def is_pin(self, point: Point) -> bool:
+        return self.is_valid_point(point) and self.pin_refs[self.index(point)] > 0
+
+    def release(self, owner: int):
+        # Free every cell held by a net
+        held = self.owner_map == owner
+        self.owner_map[held] = FREE
+        self.blocked_map[held] = 0
+
+    def valid_cells(self, cells) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Split (layer, x, y) rows into 0-based layer, y and x index arrays, dropping out-of-grid rows
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        layer, x, y = cells[:, 0], cells[:, 1], cells[:, 2]
+        valid = ((layer >= 1) & (layer <= self.num_layers) &
+                 (x >= 0) & (x < self.width) &
+                 (y >= 0) & (y < self.height))
+        return layer[valid] - 1, y[valid], x[valid]
+
+    def load_obstacles(self, obstructions):
+        # Vectorized bulk load of (layer, x, y) rows; out-of-grid rows are ignored
+        layer, y, x = self.valid_cells(obstructions)
+        self.owner_map[layer, y, x] = OBSTRUCTION
+        self.blocked_map[layer, y, x] = 1
+
+    def load_obstacle_map(self, obstacle_map: np.ndarray):
+        # Bulk load a (layer, y, x) mask of obstructed cells
+        obstructed = obstacle_map.astype(bool, copy=False)
+        self.owner_map[obstructed] = OBSTRUCTION
+        self.blocked_map[obstructed] = 1
+
+    def load_pins(self, pins):
+        # Vectorized bulk pin registration; repeated cells are counted once per row
+        layer, y, x = self.valid_cells(pins)
+        np.add.at(self.pin_refs_map, (layer, y, x), 1)
+
+class Connectivity:
+    """Connected components of the cells any net may route through.
+
+    Free cells (not blocked, not a pin) are labelled by 6-connectivity: the four
+    in-plane neighbours plus the via to the other layer. Labels only ever
+    over-approximate connectivity, so a net whose endpoints land in different
+    components cannot be routed. Committed cells are cleared incrementally;
+    anything that frees cells must call invalidate() to relabel on next use.
+    """
+
+    def __init__(self, grid: Grid):
+        self.grid = grid
+        self.labels = array('i')
+        self.stale = True
+        # Clear committed cells from the labels; off when the grid may be reset underneath
+        self.track_commits = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def build(self):
+        grid = self.grid
+        free = (grid.blocked_map == 0) & (grid.pin_refs_map == 0)
+
+        # Label horizontal runs of free cells, then join runs that touch across rows
+        # or through a via. Each touching pair of runs is recorded once, where the
+        # overlap starts.
+        starts = free.copy()
+        starts[:, :, 1:] &= ~free[:, :, :-1]
+        run_of = (np.cumsum(starts, dtype=np.int64).reshape(free.shape) - 1)
+        run_count = int(starts.sum())
+        edges = []
+        for both, a, b in ((free[:, 1:] & free[:, :-1], run_of[:, 1:], run_of[:, :-1]),
+                           (free[1:] & free[:-1], run_of[1:], run_of[:-1])):
+            first = both.copy()
+            first[:, :, 1:] &= ~both[:, :, :-1]
+            edges.append((a[first], b[first]))
+        a = np.concatenate([edge[0] for edge in edges])
+        b = np.concatenate([edge[1] for edge in edges])
+
+        # Union the runs: hook each root onto the smallest root it touches, then
+        # compress to roots, until no edge joins two roots
+        parent = np.arange(run_count, dtype=np.int64)
+        while len(a):
+            root_a, root_b = parent[a], parent[b]
+            joined = root_a != root_b
+            if not joined.any():
+                break
+            low = np.minimum(root_a[joined], root_b[joined])
+            high = np.maximum(root_a[joined], root_b[joined])
+            np.minimum.at(parent, high, low)
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+
+        labels = np.where(free, parent[run_of] if run_count else -1, -1)
+        self.labels = array('i', labels.astype(np.intc).tobytes())
+        self.stale = False
+
+    def remove(self, index: int):
+        if self.track_commits and not self.stale:
+            self.labels[index] = -1
+
+    def connected(self, sources: List[Point], targets: List[Point], net_pins: Set[Point]) -> bool:
+        # Whether some target may be reachable from some source. A net's own pins
+        # are passable, so they join the components around them.
+        grid = self.grid
+        if self.stale:
+            self.build()
+        sources = [point for point in sources if grid.is_valid_point(point)]
+        targets = [point for point in targets if grid.is_valid_point(point)]
+        if not sources or not targets or not set(sources).isdisjoint(targets):
+            return True
+
+        # Union-find over component labels (>= 0) and connector cells (-1 - index)
+        parent = {}
+
+        def find(node: int) -> int:
+            root = node
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while node != root:
+                parent[node], node = root, parent[node]
+            return root
+
+        labels = self.labels
+        width, layer_size = grid.width, grid.layer_size
+        connectors = {grid.index(point) for point in net_pins if grid.is_valid_point(point)}
+        connectors.update(grid.index(point) for point in sources + targets)
+        for index in connectors:
+            layer, rest = divmod(index, layer_size)
+            y, x = divmod(rest, width)
+            node = find(-1 - index)
+            neighbors = []
+            if layer > 0:
+                neighbors.append(index - layer_size)
+            if layer < grid.num_layers - 1:
+                neighbors.append(index + layer_size)
+            if x > 0:
+                neighbors.append(index - 1)
+            if x < width - 1:
+                neighbors.append(index + 1)
+            if y > 0:
+                neighbors.append(index - width)
+            if y < grid.height - 1:
+                neighbors.append(index + width)
+            for neighbor in neighbors:
+                if neighbor in connectors:
+                    other = -1 - neighbor
+                elif labels[neighbor] >= 0:
+                    other = labels[neighbor]
+                else:
+                    continue
+                other = find(other)
+                if other != node:
+                    parent[other] = node
+
+        roots = {find(-1 - grid.index(point)) for point in sources}
+        return any(find(-1 - grid.index(point)) in roots for point in targets)
+
+class HeapFrontier:
+    """Binary heap of packed search entries; ties pop in (cost, cell order) order."""
+
+    def __init__(self, priority_shift: int, max_step: int, entries: List[int]):
+        self.entries = entries
+        heapq.heapify(entries)
+        self.push = partial(heapq.heappush, entries)
+        self.pop = partial(heapq.heappop, entries)
+        # Raises IndexError when empty, like pop
+        self.peek = partial(operator.getitem, entries, 0)
+
+class BucketFrontier:
+    """Dial's bucket queue of packed search entries.
+
+    Searches pop priorities in non-decreasing order and push at most max_step
+    above the last pop, so every queued entry fits in a ring of buckets indexed
+    by priority, sized to also cover the spread of the initial entries. Push is
+    one list append and pop scans forward only when a bucket runs dry. Equal
+    priorities pop last in, first out, which is deterministic but not the
+    heap's tie order.
+    """
+
+    def __init__(self, priority_shift: int, max_step: int, entries: List[int]):
+        priorities = [entry >> priority_shift for entry in entries]
+        current = min(priorities, default=0)
+        span = max_step + 1 + (max(priorities) - current if priorities else 0)
+        buckets: List[List[int]] = [[] for _ in range(span)]
+        for priority, entry in zip(priorities, entries):
+            buckets[priority % span].append(entry)
+        bucket = buckets[current % span]
+
+        # Closures over the ring keep attribute lookups out of the search loop
+        def push(entry: int):
+            buckets[(entry >> priority_shift) % span].append(entry)
+
+        def advance() -> List[int]:
+            # Every queued entry is within span of current, so a full lap of
+            # empty buckets means the frontier is empty
+            nonlocal current, bucket
+            lap = span
+            while not bucket and lap:
+                current += 1
+                bucket = buckets[current % span]
+                lap -= 1
+            return bucket
+
+        def pop() -> int:
+            return (bucket or advance()).pop()
+
+        def peek() -> int:
+            return (bucket or advance())[-1]
+
+        self.push, self.pop, self.peek = push, pop, peek
+
+FRONTIERS = {'heap': HeapFrontier, 'bucket': BucketFrontier}
+
+SEARCH_MODES = ('dijkstra', 'astar', 'bidirectional', 'line-probe')
+# Which L- and Z-shaped routes two-pin connections take before any search; see pattern_path
+PATTERN_MODES = ('off', 'exact', 'fast')
+# Lines a line-probe search may probe from its sources before it falls back to A*
+PROBE_LINES = 64
+TOPOLOGIES = ('chain', 'tree')
+# Search costs are stored in int32 arrays and packed into heap entries
+COST_BITS = 31
+UNREACHED = 2 ** COST_BITS - 1
 
 class PathFinder:
-    def __init__(self, grid: Grid, via_penalty: int, wrong_direction_penalty: int):
+    def __init__(self, grid: Grid, via_penalty: int, wrong_direction_penalty: int, search: str = 'astar',
+                 window_margin: Optional[int] = None, frontier: str = 'heap'):
+        if search not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search}'. Expected one of: {', '.join(SEARCH_MODES)}.")
+        if frontier not in FRONTIERS:
+            raise ValueError(f"Unknown frontier '{frontier}'. Expected one of: {', '.join(FRONTIERS)}.")
+        # Priority queue used by searches; see new_frontier
+        self.frontier = frontier
         self.grid = grid
         self.via_penalty = via_penalty
         self.wrong_direction_penalty = wrong_direction_penalty
+        self.search = search
+        # Searches start inside the endpoints' bounding box grown by this margin (None: whole grid)
+        self.window_margin = window_margin
+        # Number of nodes popped and expanded, accumulated across searches
+        self.nodes_expanded = 0
+        # Searches solved in their first window, and windows that had to be grown
+        self.window_hits = 0
+        self.window_misses = 0
+        # Per-cell search state indexed like Grid.blocked, allocated on first use;
+        # the reverse_ arrays hold the backward frontier of bidirectional searches
+        self.cost = array('i')
+        self.parent = array('i')
+        self.reverse_cost = array('i')
+        self.reverse_parent = array('i')
+        # When a list, every cell a search reaches is appended to it
+        self.touched_log: Optional[List[int]] = None
+        # When set, searches count themselves and their frontier pushes into it
+        self.search_stats: Optional[SearchStats] = None
+        # (rows, columns) mask of the current net's coarse route; its searches stay within
+        # it grown by corridor_margin GCells, see search_corridor
+        self.corridor: Optional[np.ndarray] = None
+        self.gcell_size = 1
+        self.corridor_margin = 1
+        # Searches solved in their first corridor, and corridors that had to be widened
+        self.corridor_hits = 0
+        self.corridor_misses = 0
+        # Line-probe searches whose probes met, and those that fell back to A*
+        self.probe_hits = 0
+        self.probe_misses = 0
+        # Pattern routes tried before two-pin searches: taken, or left to the search
+        self.pattern = 'off'
+        self.pattern_hits = 0
+        self.pattern_misses = 0
 
-    def get_neighbors(self, point: Point) -> List[Tuple[Point, int]]:
-        neighbors = []
-        
+    def heuristic(self, point: Point, end: Point) -> int:
+        return self.cell_heuristic(point.layer - 1, point.x, point.y, end.layer - 1, end.x, end.y)
+
+    def cell_heuristic(self, layer: int, x: int, y: int, end_layer: int, end_x: int, end_y: int) -> int:
+        # Lower bound on the remaining cost (0-based layers): every step costs at least
+        # 1, a layer change costs a via, and wrong-direction distance on the target
+        # layer is paid either as wrong-direction moves or as a detour through two vias.
+        dx = abs(x - end_x)
+        dy = abs(y - end_y)
+        via_cost = 1 + self.via_penalty
+        if layer != end_layer:
+            return dx + dy + via_cost
+        wrong_distance = dy if end_layer == 0 else dx
+        return dx + dy + min(wrong_distance * self.wrong_direction_penalty, 2 * via_cost)
+
+    def directions(self, layer: int) -> List[Tuple[int, int, int]]:
         # Layer-specific preferred directions
-        if point.layer == 1:  # M1 - Prefer horizontal
-            directions = [
-                (1, 0, point.layer),    # Right
-                (-1, 0, point.layer),   # Left
-                (0, 0, 2),             # Via to M2
-                (0, 1, point.layer),    # Up
-                (0, -1, point.layer)    # Down
-            ]
-        else:  # M2 - Prefer vertical
-            directions = [
-                (0, 1, point.layer),    # Up
-                (0, -1, point.layer),   # Down
-                (0, 0, 1),             # Via to M1
-                (1, 0, point.layer),    # Right
-                (-1, 0, point.layer)    # Left
+        if layer == 1:  # M1 - Prefer horizontal
+            return [
+                (1, 0, layer),    # Right
+                (-1, 0, layer),   # Left
+                (0, 0, 2),        # Via to M2
+                (0, 1, layer),    # Up
+                (0, -1, layer)    # Down
             ]
+        return [  # M2 - Prefer vertical
+            (0, 1, layer),    # Up
+            (0, -1, layer),   # Down
+            (0, 0, 1),        # Via to M1
+            (1, 0, layer),    # Right
+            (-1, 0, layer)    # Left
+        ]
+
+    def move_cost(self, layer: int, dx: int, dy: int, new_layer: int) -> int:
+        cost = 1
+        if new_layer != layer:
+            cost += self.via_penalty
+        elif (layer == 1 and dy != 0) or (layer == 2 and dx != 0):
+            cost += self.wrong_direction_penalty
+        return cost
 
-        for dx, dy, new_layer in directions:
+    def get_neighbors(self, point: Point) -> List[Tuple[Point, int]]:
+        neighbors = []
+        for dx, dy, new_layer in self.directions(point.layer):
             neighbor = Point(new_layer, point.x + dx, point.y + dy)
-            
             if not self.grid.is_valid_point(neighbor):
                 continue
+            neighbors.append((neighbor, self.move_cost(point.layer, dx, dy, new_layer)))
+        return neighbors
 
-            cost = 1
-            if new_layer != point.layer:
-                cost += self.via_penalty
-            elif (point.layer == 1 and dy != 0) or (point.layer == 2 and dx != 0):
-                cost += self.wrong_direction_penalty
+    def build_moves(self) -> List[List[Tuple[int, int, int, int, int, int]]]:
+        # Per-layer (0-based) move tables of (dx, dy, new layer, index offset, key offset, cost)
+        if self.via_penalty < 0 or self.wrong_direction_penalty < 0:
+            raise ValueError("Penalties must be non-negative.")
+        grid = self.grid
+        moves = []
+        for layer in range(1, grid.num_layers + 1):
+            table = []
+            for dx, dy, new_layer in self.directions(layer):
+                if not 1 <= new_layer <= grid.num_layers:
+                    continue
+                dl = (new_layer - layer) * grid.layer_size
+                table.append((dx, dy, new_layer - 1,
+                              dl + dy * grid.width + dx,
+                              dl + dx * grid.height + dy,
+                              self.move_cost(layer, dx, dy, new_layer)))
+            moves.append(table)
+        return moves
 
-            neighbors.append((neighbor, cost))
+    def order_key(self, point: Point) -> int:
+        # Ranks cells in (layer, x, y) order so heap ties break exactly as Point.__lt__ does
+        return ((point.layer - 1) * self.grid.width + point.x) * self.grid.height + point.y
 
-        return neighbors
+    def new_frontier(self, priority_shift: int, max_step: int, entries: List[int]):
+        # Congestion costs are unbounded, so bucket queues only serve the plain move costs
+        size = len(entries)
+        if self.frontier == 'bucket' and self.grid.cost is None:
+            frontier = BucketFrontier(priority_shift, max_step, entries)
+        else:
+            frontier = HeapFrontier(priority_shift, max_step, entries)
+        # Counting wraps the frontier only when asked, leaving the plain push and pop otherwise
+        if self.search_stats is not None:
+            count_frontier(frontier, self.search_stats, size)
+        return frontier
 
-    def find_path(self, start: Point, end: Point, net_pins: Set[Point], all_pins: Set[Point]) -> Optional[List[Point]]:
-        heap = [(0, start)]
-        visited = {start: 0}
-        parent = {}
+    def find_path(self, start: Point, end: Point, net_pins: Set[Point]) -> Optional[List[Point]]:
+        if start == end:
+            self.nodes_expanded += 1
+            return [start]
+        if not (self.grid.is_valid_point(start) and self.grid.is_valid_point(end)):
+            return None
+        if self.pattern != 'off' and self.grid.cost is None:
+            # Patterns ignore congestion costs, so negotiated routing always searches
+            path = self.pattern_path(start, end, net_pins)
+            if path is not None:
+                self.pattern_hits += 1
+                return path
+            self.pattern_misses += 1
+        return self.search_windowed([start], [end], net_pins)
 
-        while heap:
-            current_cost, current = heapq.heappop(heap)
-            
-            if current == end:
-                path = []
-                while current:
-                    path.append(current)
-                    current = parent.get(current)
-                return path[::-1]
-
-            for neighbor, move_cost in self.get_neighbors(current):
-                if (neighbor in all_pins and neighbor not in net_pins) or self.grid.is_obstacle(neighbor):
+    def pattern_path(self, start: Point, end: Point, net_pins: Set[Point]) -> Optional[List[Point]]:
+        # L- and Z-shaped routes of preferred-direction runs joined by vias. HVH patterns
+        # run along the start's M1 row, along one M2 column and along the end's M1 row;
+        # VHV patterns are the same with M2 columns and one M1 row. Every column (or
+        # row) of the endpoints' bounding box is checked at once with NumPy slices, and
+        # the free ones nearest each end are tried; they are the L-shapes when those are
+        # free. The cheapest pattern is returned when the mode accepts it: 'exact' only when its
+        # cost equals the A* lower bound, so no search could find a cheaper path, and
+        # 'fast' always.
+        grid = self.grid
+        x0, x1 = sorted((start.x, end.x))
+        y0, y1 = sorted((start.y, end.y))
+        blocked = grid.blocked_map[:, y0:y1 + 1, x0:x1 + 1]
+        free = (blocked == 0) & (grid.pin_refs_map[:, y0:y1 + 1, x0:x1 + 1] == 0)
+        for pin in net_pins:
+            if 1 <= pin.layer <= grid.num_layers and x0 <= pin.x <= x1 and y0 <= pin.y <= y1:
+                free[pin.layer - 1, pin.y - y0, pin.x - x0] = not blocked[pin.layer - 1, pin.y - y0, pin.x - x0]
+        # Both families are indexed from the start towards the end
+        step_x = 1 if end.x >= start.x else -1
+        step_y = 1 if end.y >= start.y else -1
+
+        candidates = []
+        for horizontal in (True, False):
+            if horizontal:
+                first, last = free[0, start.y - y0, ::step_x], free[0, end.y - y0, ::step_x]
+                middle = free[1].all(axis=0)[::step_x]
+            else:
+                first, last = free[1, ::step_y, start.x - x0], free[1, ::step_y, end.x - x0]
+                middle = free[0].all(axis=1)[::step_y]
+            # The first run must be free from the start, the last one up to the end
+            feasible = np.flatnonzero(np.logical_and.accumulate(first) &
+                                      np.logical_and.accumulate(last[::-1])[::-1] & middle)
+            for offset in dict.fromkeys((feasible[:1].tolist() + feasible[-1:].tolist())):
+                cells = self.pattern_cells(start, end, horizontal, offset, step_x, step_y)
+                cost = sum(self.move_cost(a[0], b[1] - a[1], b[2] - a[2], b[0]) for a, b in zip(cells, cells[1:]))
+                candidates.append((cost, len(candidates), cells))
+        if not candidates:
+            return None
+        cost, _, cells = min(candidates)
+        if self.pattern == 'exact' and cost != self.heuristic(start, end):
+            return None
+        if self.touched_log is not None:
+            # The choice depends on every cell of the box; a rejection never does, as
+            # claiming more cells only rules patterns out
+            rows = np.arange(y0, y1 + 1)[:, None] * grid.width + np.arange(x0, x1 + 1)
+            layers = np.arange(grid.num_layers)[:, None] * grid.layer_size
+            self.touched_log.extend((layers + rows.ravel()).ravel().tolist())
+        return [Point(*cell) for cell in cells]
+
+    def pattern_cells(self, start: Point, end: Point, horizontal: bool, offset: int,
+                      step_x: int, step_y: int) -> List[Tuple[int, int, int]]:
+        # Cells of an HVH (horizontal) or VHV pattern whose middle run is offset cells
+        # from the start, with vias at pins on the other layer; a via straight back
+        # where a run has no length is dropped
+        if horizontal:
+            middle_x = start.x + offset * step_x
+            runs = [(1, x, start.y) for x in range(start.x, middle_x + step_x, step_x)]
+            runs += [(2, middle_x, y) for y in range(start.y, end.y + step_y, step_y)]
+            runs += [(1, x, end.y) for x in range(middle_x, end.x + step_x, step_x)]
+        else:
+            middle_y = start.y + offset * step_y
+            runs = [(2, start.x, y) for y in range(start.y, middle_y + step_y, step_y)]
+            runs += [(1, x, middle_y) for x in range(start.x, end.x + step_x, step_x)]
+            runs += [(2, end.x, y) for y in range(middle_y, end.y + step_y, step_y)]
+        cells = []
+        for cell in [start.to_tuple()] + runs + [end.to_tuple()]:
+            if cells and cells[-1] == cell:
+                continue
+            if len(cells) >= 2 and cells[-2] == cell:
+                cells.pop()
+                continue
+            cells.append(cell)
+        return cells
+
+    def find_tree_path(self, sources: List[Point], targets: List[Point], net_pins: Set[Point]) -> Optional[List[Point]]:
+        # Grow from every source cell at cost 0 and stop at the nearest target
+        for target in targets:
+            if target in sources:
+                self.nodes_expanded += 1
+                return [target]
+        sources = [point for point in sources if self.grid.is_valid_point(point)]
+        targets = [point for point in targets if self.grid.is_valid_point(point)]
+        if not sources or not targets:
+            return None
+        return self.search_windowed(sources, targets, net_pins)
+
+    def search_windowed(self, sources: List[Point], targets: List[Point], net_pins: Set[Point]) -> Optional[List[Point]]:
+        # Confine the search to the bounding box of its endpoints plus a margin and
+        # double the margin after each failure until the window covers the grid
+        grid = self.grid
+        full_window = (0, 0, grid.width - 1, grid.height - 1)
+        if self.search_stats is not None:
+            self.search_stats.searches += 1
+        if self.corridor is not None:
+            path = self.search_corridor(sources, targets, net_pins)
+            if path is not None:
+                return path
+            return self.search_cells(sources, targets, net_pins, full_window)
+        if self.window_margin is None:
+            return self.search_cells(sources, targets, net_pins, full_window)
+
+        points = sources + targets
+        min_x = min(point.x for point in points)
+        min_y = min(point.y for point in points)
+        max_x = max(point.x for point in points)
+        max_y = max(point.y for point in points)
+        margin = self.window_margin
+        while True:
+            window = (max(min_x - margin, 0), max(min_y - margin, 0),
+                      min(max_x + margin, grid.width - 1), min(max_y + margin, grid.height - 1))
+            path = self.search_cells(sources, targets, net_pins, window)
+            if path is not None or window == full_window:
+                if path is not None and margin == self.window_margin:
+                    self.window_hits += 1
+                return path
+            self.window_misses += 1
+            margin = max(margin * 2, 1)
+
+    def search_corridor(self, sources: List[Point], targets: List[Point], net_pins: Set[Point]) -> Optional[List[Point]]:
+        # Confine the search to the corridor plus the endpoints' GCells by blocking a
+        # fence of cells around it, doubling the margin after each failure; None once
+        # the corridor would cover the whole grid
+        grid = self.grid
+        size = self.gcell_size
+        mask = self.corridor.copy()
+        for point in sources + targets:
+            mask[point.y // size, point.x // size] = True
+        blocked = grid.blocked_map.reshape(-1)
+        margin = self.corridor_margin
+        while True:
+            grown = dilate(mask, margin)
+            if grown.all():
+                return None
+            window, fence = corridor_fence(grown, size, grid.width, grid.height, grid.num_layers)
+            fence = fence[blocked[fence] == 0]
+            blocked[fence] = 1
+            try:
+                path = self.search_cells(sources, targets, net_pins, window)
+            finally:
+                blocked[fence] = 0
+            if path is not None:
+                if margin == self.corridor_margin:
+                    self.corridor_hits += 1
+                return path
+            self.corridor_misses += 1
+            margin = max(margin * 2, 1)
+
+    def search_probe(self, sources: List[Point], targets: List[Point], net_pins: Set[Point],
+                     window: Tuple[int, int, int, int]) -> Optional[List[Point]]:
+        # Line search in the style of Mikami-Tabuchi and Hightower. A line is the run of
+        # free cells through a cell along its layer's preferred direction (M1 rows, M2
+        # columns). The targets get their line and, through a via, the other layer's
+        # line. From the sources, lines are then probed best first: every cell of a
+        # probed line offers an escape through a via onto the other layer, ranked by
+        # the cost to reach it plus its distance to the nearest target line. The first
+        # probed cell on or over a target line connects the two. Paths have no
+        # wrong-direction moves but are not minimum-cost; None if PROBE_LINES lines
+        # are probed without reaching a target line.
+        grid = self.grid
+        width, layer_size = grid.width, grid.layer_size
+        min_x, min_y, max_x, max_y = window
+        blocked, pin_refs = grid.blocked, grid.pin_refs
+        own_pins = {grid.index(pin) for pin in net_pins if grid.is_valid_point(pin)}
+        via_cost = 1 + self.via_penalty
+        # Per side (sources, targets): lines as (parent line or -1, entry cell), and the
+        # line covering each cell
+        lines = ([], [])
+        covered = ({}, {})
+        scanned = 0
+
+        if self.touched_log is None:
+            def free(index: int) -> bool:
+                return not blocked[index] and (not pin_refs[index] or index in own_pins)
+        else:
+            # Escape points are picked from cells the probes never cover, so every cell
+            # read is logged; claiming any of them could change the path
+            touched_log = self.touched_log
+
+            def free(index: int) -> bool:
+                touched_log.append(index)
+                return not blocked[index] and (not pin_refs[index] or index in own_pins)
+
+        def other_layer(index: int) -> int:
+            return index - layer_size if index >= layer_size else index + layer_size
+
+        def position(index: int) -> int:
+            # Coordinate along the cell's line: x on M1, y on M2
+            return index % width if index < layer_size else (index - layer_size) // width
+
+        def probe(side: int, entry: int, parent: int) -> Tuple[List[int], Optional[int]]:
+            # Cover the line through entry; return its cells, nearest entry first, and the
+            # nearest of them on or over a line of the other side
+            nonlocal scanned
+            line = len(lines[side])
+            lines[side].append((parent, entry))
+            step, low, high = (1, min_x, max_x) if entry < layer_size else (width, min_y, max_y)
+            at = position(entry)
+            before = []
+            index, lower = entry - step, at - 1
+            while lower >= low and free(index):
+                before.append(index)
+                index -= step
+                lower -= 1
+            after = []
+            index, upper = entry + step, at + 1
+            while upper <= high and free(index):
+                after.append(index)
+                index += step
+                upper += 1
+            cells = [entry]
+            for pair in zip(before, after):
+                cells.extend(pair)
+            cells.extend(before[len(after):] or after[len(before):])
+            scanned += len(cells)
+            cover, other = covered[side], covered[1 - side]
+            meeting = None
+            for index in cells:
+                if meeting is None and (index in other or other_layer(index) in other):
+                    meeting = index
+                cover.setdefault(index, line)
+            return cells, meeting
+
+        def walk(side: int, line: int, index: int) -> List[int]:
+            # Cells from index back to the side's source or target, via each line's entry
+            cells = []
+            while True:
+                parent, entry = lines[side][line]
+                step = (1 if entry < layer_size else width) * (1 if entry > index else -1)
+                cells.extend(range(index, entry, step))
+                cells.append(entry)
+                if parent == -1:
+                    return cells
+                index, line = other_layer(entry), parent
+
+        def finish(index: Optional[int]) -> Optional[List[Point]]:
+            self.nodes_expanded += scanned
+            if self.touched_log is not None:
+                self.touched_log.extend(covered[0])
+                self.touched_log.extend(covered[1])
+            if index is None:
+                self.probe_misses += 1
+                return None
+            self.probe_hits += 1
+            targets_covered = covered[1]
+            meet = index if index in targets_covered else other_layer(index)
+            path = walk(0, covered[0][index], index)[::-1]
+            path.extend(walk(1, targets_covered[meet], meet)[meet == index:])
+            return [grid.point_at(cell) for cell in path]
+
+        # Target lines, as (M2 line, fixed coordinate, first, last) for the distance estimate
+        segments = []
+        for point in targets:
+            entry = grid.index(point)
+            if entry in covered[1]:
+                continue
+            cells, _ = probe(1, entry, -1)
+            escape = other_layer(entry)
+            line = len(lines[1]) - 1
+            branches = [cells]
+            if free(escape) and escape not in covered[1]:
+                branches.append(probe(1, escape, line)[0])
+            for branch in branches:
+                along = [position(cell) for cell in branch]
+                fixed = branch[0] % width if branch[0] >= layer_size else branch[0] // width
+                segments.append((branch[0] >= layer_size, fixed, min(along), max(along)))
+
+        def distance(index: int) -> int:
+            # Manhattan distance from a cell to the nearest target line
+            y, x = divmod(index % layer_size, width)
+            best = None
+            for vertical, fixed, first, last in segments:
+                if vertical:
+                    d = abs(x - fixed) + (first - y if y < first else y - last if y > last else 0)
+                else:
+                    d = abs(y - fixed) + (first - x if x < first else x - last if x > last else 0)
+                if best is None or d < best:
+                    best = d
+            return best
+
+        # Escapes as (estimate, distance left, entry cell, parent line, cost at entry)
+        escapes = []
+
+        def offer(line: int, cells: List[int], entry_cost: int):
+            # Escape points, as in Hightower's router: the cells nearest each end of the
+            # line, to pass the obstacles that stop it, and the cell nearest a target line
+            escapes_at = [index for index in cells
+                          if free(other_layer(index)) and other_layer(index) not in covered[0]]
+            if not escapes_at:
+                return
+            ordered = sorted(escapes_at, key=position)
+            chosen = {ordered[0], ordered[-1], min(escapes_at, key=distance)}
+            at = position(cells[0])
+            for index in chosen:
+                escape = other_layer(index)
+                cost = entry_cost + abs(position(index) - at) + via_cost
+                left = distance(escape)
+                heapq.heappush(escapes, (cost + left, left, escape, line, cost))
+
+        for point in sources:
+            entry = grid.index(point)
+            if entry in covered[0]:
+                continue
+            cells, meeting = probe(0, entry, -1)
+            if meeting is not None:
+                return finish(meeting)
+            offer(len(lines[0]) - 1, cells, 0)
+
+        while escapes and len(lines[0]) < PROBE_LINES:
+            _, _, entry, parent, cost = heapq.heappop(escapes)
+            if entry in covered[0]:
+                continue
+            cells, meeting = probe(0, entry, parent)
+            if meeting is not None:
+                return finish(meeting)
+            offer(len(lines[0]) - 1, cells, cost)
+        return finish(None)
+
+    def search_cells(self, sources: List[Point], targets: List[Point], net_pins: Set[Point],
+                     window: Tuple[int, int, int, int]) -> Optional[List[Point]]:
+        if self.search == 'bidirectional' and len(sources) == 1 and len(targets) == 1:
+            return self.search_bidirectional(sources[0], targets[0], net_pins, window)
+        if self.search == 'line-probe' and self.grid.cost is None:
+            # Probes ignore congestion costs, so negotiated routing always searches cells.
+            # When the probes do not meet, A* searches the same window.
+            path = self.search_probe(sources, targets, net_pins, window)
+            if path is not None:
+                return path
+        grid = self.grid
+        width, height, layer_size = grid.width, grid.height, grid.layer_size
+        min_x, min_y, max_x, max_y = window
+        blocked, pin_refs = grid.blocked, grid.pin_refs
+        cell_cost = grid.cost  # Congestion cost of entering a cell, or None outside negotiation
+        # Pins of other nets are off limits; this net's own pins are not
+        own_pins = {grid.index(pin) for pin in net_pins if grid.is_valid_point(pin)}
+        moves = self.build_moves()
+        if len(self.cost) != grid.size:
+            self.cost = array('i', [UNREACHED]) * grid.size
+            self.parent = array('i', [-1]) * grid.size
+        cost, parent = self.cost, self.parent
+
+        use_heuristic = self.search != 'dijkstra'
+        target_indices = {grid.index(point) for point in targets}
+        target_cells = [(point.layer - 1, point.x, point.y) for point in targets]
+        single_target = len(target_cells) == 1
+        end_layer, end_x, end_y = target_cells[0]
+        via_cost = 1 + self.via_penalty
+        wrong_penalty = self.wrong_direction_penalty
+
+        # Heap entries pack (priority, cost, order key) into one int so ties break in
+        # Point order and comparisons stay in C; the cell index is recovered from the key
+        key_bits = grid.size.bit_length()
+        priority_shift = key_bits + COST_BITS
+        key_mask = (1 << key_bits) - 1
+        cost_mask = (1 << COST_BITS) - 1
+
+        touched = []
+        entries = []
+        for point in sources:
+            index = grid.index(point)
+            if cost[index] == 0:
+                continue
+            cost[index] = 0
+            parent[index] = -1
+            touched.append(index)
+            priority = min(self.heuristic(point, target) for target in targets) if use_heuristic else 0
+            entries.append((priority << priority_shift) | self.order_key(point))
+        # A consistent heuristic rises by at most one move cost per move
+        max_move = max(move[5] for table in moves for move in table)
+        frontier = self.new_frontier(priority_shift, 2 * max_move if use_heuristic else max_move, entries)
+        push, pop = frontier.push, frontier.pop
+        expanded = 0
+        found = -1
+
+        while True:
+            try:
+                entry = pop()
+            except IndexError:
+                break
+            key = entry & key_mask
+            current_cost = (entry >> key_bits) & cost_mask
+            layer, rest = divmod(key, layer_size)
+            x, y = divmod(rest, height)
+            current = layer * layer_size + y * width + x
+            if current_cost > cost[current]:
+                continue  # Stale entry superseded by a cheaper push
+            expanded += 1
+
+            if current in target_indices:
+                found = current
+                break
+
+            for dx, dy, new_layer, index_offset, key_offset, move_cost in moves[layer]:
+                nx = x + dx
+                ny = y + dy
+                if nx < min_x or nx > max_x or ny < min_y or ny > max_y:
+                    continue
+                neighbor = current + index_offset
+                if blocked[neighbor] or (pin_refs[neighbor] and neighbor not in own_pins):
                     continue
 
                 new_cost = current_cost + move_cost
-                if neighbor not in visited or new_cost < visited[neighbor]:
-                    visited[neighbor] = new_cost
+                if cell_cost is not None:
+                    new_cost += cell_cost[neighbor]
+                old_cost = cost[neighbor]
+                if new_cost < old_cost:
+                    if old_cost == UNREACHED:
+                        touched.append(neighbor)
+                    cost[neighbor] = new_cost
                     parent[neighbor] = current
-                    heapq.heappush(heap, (new_cost, neighbor))
+                    priority = new_cost
+                    if use_heuristic:
+                        if single_target:
+                            # Inlined cell_heuristic; this is the hottest line of the router
+                            hx = nx - end_x if nx > end_x else end_x - nx
+                            hy = ny - end_y if ny > end_y else end_y - ny
+                            if new_layer != end_layer:
+                                priority += hx + hy + via_cost
+                            else:
+                                wrong = (hy if end_layer == 0 else hx) * wrong_penalty
+                                priority += hx + hy + (wrong if wrong < 2 * via_cost else 2 * via_cost)
+                        else:
+                            priority += min(self.cell_heuristic(new_layer, nx, ny, tl, tx, ty)
+                                            for tl, tx, ty in target_cells)
+                    push((priority << priority_shift) | (new_cost << key_bits) | (key + key_offset))
+
+        self.nodes_expanded += expanded
+        path = None
+        if found != -1:
+            path = []
+            current = found
+            while current != -1:
+                path.append(grid.point_at(current))
+                current = parent[current]
+            path.reverse()
+
+        if self.touched_log is not None:
+            self.touched_log.extend(touched)
 
-        return None
+        # Reset only the cells this search touched
+        for index in touched:
+            cost[index] = UNREACHED
+        return path
+
+    def search_bidirectional(self, start: Point, end: Point, net_pins: Set[Point],
+                             window: Tuple[int, int, int, int]) -> Optional[List[Point]]:
+        # Bidirectional A* with average potentials p(v) = (h_end(v) - h_start(v)) / 2,
+        # doubled to stay integral. Moves are symmetric apart from the congestion cost
+        # of the cell entered, so both frontiers search the same reduced graph. Keys
+        # are 2 * cost + h_end - h_start forward and 2 * cost + h_start - h_end
+        # backward; once the two smallest keys sum to at least twice the best
+        # meeting cost, no shorter path remains.
+        grid = self.grid
+        width, height, layer_size = grid.width, grid.height, grid.layer_size
+        min_x, min_y, max_x, max_y = window
+        blocked, pin_refs = grid.blocked, grid.pin_refs
+        cell_cost = grid.cost
+        own_pins = {grid.index(pin) for pin in net_pins if grid.is_valid_point(pin)}
+        moves = self.build_moves()
+        if len(self.reverse_cost) != grid.size:
+            self.reverse_cost = array('i', [UNREACHED]) * grid.size
+            self.reverse_parent = array('i', [-1]) * grid.size
+        if len(self.cost) != grid.size:
+            self.cost = array('i', [UNREACHED]) * grid.size
+            self.parent = array('i', [-1]) * grid.size
+        costs = (self.cost, self.reverse_cost)
+        parents = (self.parent, self.reverse_parent)
+
+        start_index, end_index = grid.index(start), grid.index(end)
+        start_cell = start_layer, start_x, start_y = (start.layer - 1, start.x, start.y)
+        end_cell = end_layer, end_x, end_y = (end.layer - 1, end.x, end.y)
+        cell_heuristic = self.cell_heuristic
+        via_cost = 1 + self.via_penalty
+        wrong_penalty = self.wrong_direction_penalty
+
+        key_bits = grid.size.bit_length()
+        priority_shift = key_bits + COST_BITS
+        key_mask = (1 << key_bits) - 1
+        cost_mask = (1 << COST_BITS) - 1
+
+        # The backward search starts on the end cell, which the forward search may
+        # only enter when it is passable; it may finish on the start cell regardless
+        if blocked[end_index] or (pin_refs[end_index] and end_index not in own_pins):
+            return None
+        # Keys rise by at most 2 * move + |change in h_end| + |change in h_start| per move
+        max_move = max(move[5] for table in moves for move in table)
+        touched = ([start_index], [end_index])
+        frontiers = []
+        for side, (index, point, cell, other) in enumerate(((start_index, start, start_cell, end_cell),
+                                                            (end_index, end, end_cell, start_cell))):
+            costs[side][index] = 0
+            parents[side][index] = -1
+            entry = (cell_heuristic(*cell, *other) << priority_shift) | self.order_key(point)
+            frontiers.append(self.new_frontier(priority_shift, 4 * max_move, [entry]))
+        best = UNREACHED
+        meeting = -1
+        expanded = 0
+
+        forward_peek, backward_peek = frontiers[0].peek, frontiers[1].peek
+        while True:
+            try:
+                forward_top, backward_top = forward_peek(), backward_peek()
+            except IndexError:
+                break
+            if (forward_top >> priority_shift) + (backward_top >> priority_shift) >= 2 * best:
+                break
+            # Grow the frontier with the smaller key
+            side = 0 if forward_top <= backward_top else 1
+            cost, parent = costs[side], parents[side]
+            other_cost = costs[1 - side]
+            frontier, side_touched = frontiers[side], touched[side]
+            entry = frontier.pop()
+            key = entry & key_mask
+            current_cost = (entry >> key_bits) & cost_mask
+            layer, rest = divmod(key, layer_size)
+            x, y = divmod(rest, height)
+            current = layer * layer_size + y * width + x
+            if current_cost > cost[current]:
+                continue
+            expanded += 1
+
+            for dx, dy, new_layer, index_offset, key_offset, move_cost in moves[layer]:
+                nx = x + dx
+                ny = y + dy
+                if nx < min_x or nx > max_x or ny < min_y or ny > max_y:
+                    continue
+                neighbor = current + index_offset
+                if (blocked[neighbor] or (pin_refs[neighbor] and neighbor not in own_pins)) and \
+                        not (side == 1 and neighbor == start_index):
+                    continue
+
+                # Forward moves pay to enter the neighbour, backward moves to leave it
+                new_cost = current_cost + move_cost
+                if cell_cost is not None:
+                    new_cost += cell_cost[neighbor if side == 0 else current]
+                old_cost = cost[neighbor]
+                if new_cost < old_cost:
+                    if old_cost == UNREACHED:
+                        side_touched.append(neighbor)
+                    cost[neighbor] = new_cost
+                    parent[neighbor] = current
+                    # Inlined cell_heuristic towards both ends
+                    hx = nx - end_x if nx > end_x else end_x - nx
+                    hy = ny - end_y if ny > end_y else end_y - ny
+                    if new_layer != end_layer:
+                        to_end = hx + hy + via_cost
+                    else:
+                        wrong = (hy if end_layer == 0 else hx) * wrong_penalty
+                        to_end = hx + hy + (wrong if wrong < 2 * via_cost else 2 * via_cost)
+                    hx = nx - start_x if nx > start_x else start_x - nx
+                    hy = ny - start_y if ny > start_y else start_y - ny
+                    if new_layer != start_layer:
+                        to_start = hx + hy + via_cost
+                    else:
+                        wrong = (hy if start_layer == 0 else hx) * wrong_penalty
+                        to_start = hx + hy + (wrong if wrong < 2 * via_cost else 2 * via_cost)
+                    priority = 2 * new_cost + (to_end - to_start if side == 0 else to_start - to_end)
+                    frontier.push((priority << priority_shift) | (new_cost << key_bits) | (key + key_offset))
+                    if other_cost[neighbor] != UNREACHED and new_cost + other_cost[neighbor] < best:
+                        best = new_cost + other_cost[neighbor]
+                        meeting = neighbor
+
+        self.nodes_expanded += expanded
+        path = None
+        if meeting != -1:
+            path = []
+            current = meeting
+            while current != -1:
+                path.append(grid.point_at(current))
+                current = self.parent[current]
+            path.reverse()
+            current = self.reverse_parent[meeting]
+            while current != -1:
+                path.append(grid.point_at(current))
+                current = self.reverse_parent[current]
+
+        if self.touched_log is not None:
+            self.touched_log.extend(touched[0])
+            self.touched_log.extend(touched[1])
+        for side in (0, 1):
+            cost = costs[side]
+            for index in touched[side]:
+                cost[index] = UNREACHED
+        return path
 
 class MazeRouter:
-    def __init__(self, router_input: MazeRouterInput, via_penalty: Optional[int] = None, wrong_direction_penalty: Optional[int] = None):
+    def __init__(self, router_input: MazeRouterInput, via_penalty: Optional[int] = None, wrong_direction_penalty: Optional[int] = None,
+                 search: str = 'astar', topology: str = 'chain', window_margin: Optional[int] = None,
+                 frontier: str = 'heap', grid: Optional[Grid] = None, pattern: str = 'off'):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown net topology '{topology}'. Expected one of: {', '.join(TOPOLOGIES)}.")
+        if pattern not in PATTERN_MODES:
+            raise ValueError(f"Unknown pattern mode '{pattern}'. Expected one of: {', '.join(PATTERN_MODES)}.")
         self.input = router_input
-        self.grid = Grid(router_input.grid_width, router_input.grid_height)
+        self.topology = topology
+        # A prebuilt grid must already hold the design's obstructions and pins
+        self.grid = grid if grid is not None else Grid(router_input.grid_width, router_input.grid_height)
         
         # Use provided penalties or fall back to input file values
         self.via_penalty = via_penalty if via_penalty is not None else router_input.via_penalty
         self.wrong_direction_penalty = wrong_direction_penalty if wrong_direction_penalty is not None else router_input.wrong_direction_penalty
+        if self.via_penalty < 0 or self.wrong_direction_penalty < 0:
+            raise ValueError("Penalties must be non-negative.")
         
-        self.path_finder = PathFinder(self.grid, self.via_penalty, self.wrong_direction_penalty)
-        self.initialize_grid()
+        # Owner ids written into the grid for routed cells
+        self.net_ids = {name: net_id for net_id, name in enumerate(router_input.net_names, start=1)}
+        self.next_net_id = len(router_input.net_names) + 1
+        # When a list, the index of every cell committed to a net is appended to it
+        self.commit_log: Optional[List[int]] = None
+        # Per-net instrumentation, collected only after enable_stats()
+        self.net_stats: Optional[List[NetStats]] = None
+        self.commit_time = 0.0
+
+        self.path_finder = PathFinder(self.grid, self.via_penalty, self.wrong_direction_penalty, search, window_margin,
+                                      frontier)
+        self.path_finder.pattern = pattern
+        # Searches between endpoints in different components are skipped and counted here
+        self.connectivity = Connectivity(self.grid)
+        self.rejected_searches = 0
+        # Coarse routes whose GCells confine each net's searches, set by use_global_routing()
+        self.global_routing: Optional[GlobalRouting] = None
+        if grid is None:
+            self.initialize_grid()
+        else:
+            self.connectivity.build()
 
     def initialize_grid(self):
         # Mark obstructions
-        for layer, x, y in self.input.obstructions:
-            self.grid.set_obstacle(Point(layer, x, y))
+        if self.input.obstruction_map is not None:
+            self.grid.load_obstacle_map(self.input.obstruction_map)
+        else:
+            self.grid.load_obstacles(self.input.obstructions)
+
+        # Register every pin once so searches can reject foreign pins in O(1)
+        self.grid.load_pins(self.input.pin_array())
+        self.connectivity.build()
+
+    def set_penalties(self, via_penalty: int, wrong_direction_penalty: int):
+        # Searches read the penalties from the path finder, so they take effect from the next search
+        self.via_penalty = self.path_finder.via_penalty = via_penalty
+        self.wrong_direction_penalty = self.path_finder.wrong_direction_penalty = wrong_direction_penalty
+
+    def use_global_routing(self, global_routing: GlobalRouting, corridor_margin: int = 1):
+        # Confine each net's searches to its coarse route grown by corridor_margin GCells
+        if corridor_margin < 0:
+            raise ValueError("Corridor margin must be non-negative.")
+        self.global_routing = global_routing
+        self.path_finder.gcell_size = global_routing.gcell_size
+        self.path_finder.corridor_margin = corridor_margin
+
+    def add_net(self, net: Dict):
+        self.input.nets.append(net)
+        self.net_ids[net['name']] = self.next_net_id
+        self.next_net_id += 1
+        for point in self.convert_to_points(net['pins']):
+            self.grid.add_pin(point)
+
+    def net_id(self, name: str) -> int:
+        # Owner id of a net's wire; never OBSTRUCTION, which release() would free everywhere
+        net_id = self.net_ids.get(name)
+        if net_id is None:
+            raise ValueError(f"Net '{name}' is not in the design.")
+        return net_id
+
+    def reroute_net(self, net: Dict) -> Optional[Tuple[SegmentPath, int, int]]:
+        # Rip up the net's wire and route it again around every other net
+        net_id = self.net_ids.get(net['name'])
+        if net_id is not None:
+            self.grid.release(net_id)
+        self.connectivity.invalidate()
+        return self.route_net(net)
+
+    def remove_net(self, name: str):
+        # Drop the net's pins and any wire it has routed
+        names = self.input.net_names
+        for index in reversed([i for i, net_name in enumerate(names) if net_name == name]):
+            for layer, x, y in self.input.net_pins(index):
+                self.grid.remove_pin(Point(layer, x, y))
+            del self.input.nets[index]
+        net_id = self.net_ids.pop(name, None)
+        if net_id is not None:
+            self.grid.release(net_id)
+        self.connectivity.invalidate()
 
     def convert_to_points(self, pins: List[Dict]) -> List[Point]:
         return [Point(pin['layer'], pin['x'], pin['y']) for pin in pins]
 
-    def route_net(self, net: Dict) -> Optional[Tuple[List[Tuple[int, int, int]], int, int]]:
+    def route_nets(self, order: Optional[List[int]] = None):
+        """Route every net, taking net indices in order (input order by default).
+
+        Yields (net, result) pairs in input order, each as soon as every earlier
+        net in the input has been routed.
+        """
+        nets = self.input.nets
+        done = {}
+        next_index = 0
+        for index in (order if order is not None else range(len(nets))):
+            done[index] = self.route_net(nets[index])
+            while next_index in done:
+                yield nets[next_index], done.pop(next_index)
+                next_index += 1
+
+    def enable_stats(self):
+        # Record a NetStats entry for every net routed from now on
+        self.net_stats = []
+        self.path_finder.search_stats = SearchStats()
+
+    def route_net(self, net: Dict) -> Optional[Tuple[SegmentPath, int, int]]:
+        if self.net_stats is not None:
+            return self.route_net_measured(net)
+        segments = self.route_segments(net)
+        if segments is None:
+            return None
+        return self.build_result(segments)
+
+    def route_net_measured(self, net: Dict) -> Optional[Tuple[SegmentPath, int, int]]:
+        path_finder = self.path_finder
+        search_stats = path_finder.search_stats
+        search_stats.peak_frontier = 0
+        before = (path_finder.nodes_expanded, search_stats.nodes_pushed, search_stats.searches,
+                  path_finder.window_misses, self.rejected_searches)
+        self.commit_time = 0.0
+        started = time.perf_counter()
+        segments = self.route_segments(net)
+        result = self.build_result(segments) if segments is not None else None
+        wall_time = time.perf_counter() - started
+        self.net_stats.append(NetStats(
+            name=net['name'],
+            routed=result is not None,
+            wall_time=wall_time,
+            commit_time=self.commit_time,
+            nodes_expanded=path_finder.nodes_expanded - before[0],
+            nodes_pushed=search_stats.nodes_pushed - before[1],
+            peak_frontier=search_stats.peak_frontier,
+            searches=search_stats.searches - before[2],
+            window_retries=path_finder.window_misses - before[3],
+            rejected_searches=self.rejected_searches - before[4],
+            wire_length=result[1] if result else 0,
+            vias=result[2] if result else 0,
+        ))
+        return result
+
+    def route_segments(self, net: Dict) -> Optional[List[List[Point]]]:
         pins = self.convert_to_points(net['pins'])
         if len(pins) < 2:
             raise ValueError(f"Net '{net['name']}' does not have enough pins to route.")
 
-        # Convert all pins to sets for efficient lookup
         net_pins = set(pins)
-        all_pins = {Point(pin['layer'], pin['x'], pin['y']) for net in self.input.nets for pin in net['pins']}
+        if self.global_routing is not None:
+            corridors = self.global_routing.corridors
+            self.path_finder.corridor = (self.global_routing.corridor_mask(net['name'])
+                                         if net['name'] in corridors else None)
 
-        full_path = []
-        total_wire_length = 0
-        number_of_vias = 0
+        net_id = self.net_id(net['name'])
+        if self.topology == 'tree':
+            return self.route_tree(pins, net_pins, net_id)
+        return self.route_chain(pins, net_pins, net_id)
 
-        for i in range(len(pins) - 1):
-            path_segment = self.path_finder.find_path(pins[i], pins[i + 1], net_pins, all_pins)
-            if not path_segment:
-                return None
+    def build_result(self, segments: List[List[Point]]) -> Tuple[SegmentPath, int, int]:
+        path = SegmentPath.from_segments(segments)
+        wire_length, vias = path.metrics()
+        return path, wire_length, vias
 
-            # Calculate metrics
-            for j in range(1, len(path_segment)):
-                prev, curr = path_segment[j - 1], path_segment[j]
-                total_wire_length += abs(curr.x - prev.x) + abs(curr.y - prev.y)
-                if curr.layer != prev.layer:
-                    number_of_vias += 1
+    def route_negotiated(self, max_iterations: int = 30, present_factor: int = 1, present_growth: int = 2,
+                         history_increment: int = 1) -> Tuple[Dict[str, Tuple[SegmentPath, int, int]], List['IterationStats']]:
+        # Negotiated congestion: nets may share cells at a present + history cost that
+        # rises every iteration; nets on overused cells are ripped up and rerouted
+        # until no cell is shared or the iteration cap is reached.
+        grid = self.grid
+        nets = self.input.nets
+        grid.enable_congestion()
+        grid.present_factor = present_factor
+        segments_by_net: List[Optional[List[List[Point]]]] = [None] * len(nets)
+        cells_by_net: List[List[int]] = [[] for _ in nets]
+        stats = []
+        pending = range(len(nets))
 
-            # Skip first point if not first segment to avoid duplicates
-            if i > 0:
-                path_segment = path_segment[1:]
+        for iteration in range(1, max_iterations + 1):
+            started = time.perf_counter()
+            for i in pending:
+                net = nets[i]
+                grid.add_usage(cells_by_net[i], -1)
+                segments = self.route_segments(net)
+                net_pins = set(self.convert_to_points(net['pins']))
+                if segments is None:
+                    # Drop any partial wire the failed attempt left blocked
+                    grid.release(self.net_id(net['name']))
+                    cells = []
+                else:
+                    # Turn the net's wire from a hard block into shared usage
+                    cells = list(dict.fromkeys(grid.index(point) for segment in segments
+                                               for point in segment if point not in net_pins))
+                    for index in cells:
+                        grid.owner[index] = FREE
+                        grid.blocked[index] = 0
+                    grid.add_usage(cells, 1)
+                segments_by_net[i] = segments
+                cells_by_net[i] = cells
 
-            full_path.extend(path_segment)
+            next_factor = min(grid.present_factor * present_growth, MAX_PRESENT_FACTOR)
+            overused = grid.update_congestion(next_factor, history_increment)
+            stats.append(IterationStats(
+                iteration=iteration,
+                overused_cells=overused,
+                rerouted_nets=len(pending),
+                failed_nets=sum(1 for segments in segments_by_net if segments is None),
+                wall_time=time.perf_counter() - started,
+            ))
+            if overused == 0:
+                break
+
+            usage = grid.usage
+            pending = [i for i, cells in enumerate(cells_by_net)
+                       if any(usage[index] > 1 for index in cells)]
+
+        # Commit in input order; nets still sharing a cell with an earlier net are
+        # retried serially against the committed wire, as in the plain router
+        grid.disable_congestion()
+        committed = [False] * len(nets)
+        for i, net in enumerate(nets):
+            segments = segments_by_net[i]
+            if segments is None or any(grid.owner[index] != FREE for index in cells_by_net[i]):
+                continue
+            net_id = self.net_id(net['name'])
+            for index in cells_by_net[i]:
+                grid.owner[index] = net_id
+                grid.blocked[index] = 1
+            committed[i] = True
 
-            # Mark path as obstacles (except pins)
-            for point in path_segment[:-1]:
-                if point not in net_pins:
-                    self.grid.set_obstacle(point)
+        routing_results = {}
+        for i, net in enumerate(nets):
+            segments = segments_by_net[i] if committed[i] else self.route_segments(net)
+            if segments is not None:
+                routing_results[net['name']] = self.build_result(segments)
+        return routing_results, stats
 
-        # Convert points back to tuples for compatibility
-        path_tuples = [point.to_tuple() for point in full_path]
-        return path_tuples, total_wire_length, number_of_vias
+    def commit_segment(self, path_segment: List[Point], net_pins: Set[Point], net_id: int):
+        # Mark path as owned by this net (except pins). Negotiation frees the wire
+        # again right away, so it stays in the connectivity labels there.
+        if self.net_stats is not None:
+            started = time.perf_counter()
+        track = self.grid.cost is None
+        for point in path_segment:
+            if point not in net_pins:
+                self.grid.set_owner(point, net_id)
+                if track:
+                    self.connectivity.remove(self.grid.index(point))
+                if self.commit_log is not None:
+                    self.commit_log.append(self.grid.index(point))
+        if self.net_stats is not None:
+            self.commit_time += time.perf_counter() - started
+
+    def reachable(self, sources: List[Point], targets: List[Point], net_pins: Set[Point]) -> bool:
+        # Skip searches the connectivity labels prove hopeless
+        if self.connectivity.connected(sources, targets, net_pins):
+            return True
+        self.rejected_searches += 1
+        return False
+
+    def route_chain(self, pins: List[Point], net_pins: Set[Point], net_id: int) -> Optional[List[List[Point]]]:
+        # Connect pins in file order: pins[0] -> pins[1] -> ...
+        segments = []
+        for i in range(len(pins) - 1):
+            if not self.reachable([pins[i]], [pins[i + 1]], net_pins):
+                return None
+            path_segment = self.path_finder.find_path(pins[i], pins[i + 1], net_pins)
+            if not path_segment:
+                # The labels joined cells that committed wire has since separated
+                self.connectivity.invalidate()
+                return None
+            self.commit_segment(path_segment, net_pins, net_id)
+            segments.append(path_segment)
+        return segments
+
+    def route_tree(self, pins: List[Point], net_pins: Set[Point], net_id: int) -> Optional[List[List[Point]]]:
+        # Grow a tree from pins[0]: every cell already on the tree seeds the search and
+        # the nearest unconnected pin is attached next. Each segment starts on the tree.
+        tree = [pins[0]]
+        unconnected = [pin for pin in dict.fromkeys(pins[1:]) if pin != pins[0]]
+        segments = []
+        while unconnected:
+            if not self.reachable(tree, unconnected, net_pins):
+                return None
+            path_segment = self.path_finder.find_tree_path(tree, unconnected, net_pins)
+            if not path_segment:
+                self.connectivity.invalidate()
+                return None
+            self.commit_segment(path_segment, net_pins, net_id)
+            segments.append(path_segment)
+            tree.extend(path_segment[1:])
+            reached = set(path_segment)
+            unconnected = [pin for pin in unconnected if pin not in reached]
+        return segments or [[pins[0]]]
 
 def parse_input_file(filename):
     with open(filename, 'r') as f:
@@ -281,12 +1695,16 @@ def main():
             path_str = ' '.join(f'({layer}, {x}, {y})' for layer, x, y in paths)
             print(f"{net_name}: {path_str}")
 
-def route_all_nets(router_input: MazeRouterInput) -> Dict[str, Tuple[List[Tuple[int, int, int]], int, int]]:
+def route_all_nets(router_input: MazeRouterInput, jobs: int = 1,
+                   order: str = 'input') -> Dict[str, Tuple[SegmentPath, int, int]]:
     router = MazeRouter(router_input)
+    indices = net_order(router_input, order)
+    if jobs > 1:
+        from parallel import route_parallel
+        return route_parallel(router, jobs, order=indices)
     routing_results = {}
 
-    for net in router_input.nets:
-        result = router.route_net(net)
+    for net, result in router.route_nets(indices):
         if result:
             routing_results[net['name']] = result
 
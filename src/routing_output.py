@@ -0,0 +1,100 @@
+import csv
+import json
+import sys
+from dataclasses import asdict, fields
+from itertools import chain
+from typing import List, Optional, Tuple, Union
+from router import NetStats, SegmentPath
+
+Cell = Tuple[int, int, int]
+# Layer view renderers; kept here so the CLI can offer them without importing matplotlib
+PLOT_STYLES = ('auto', 'vector', 'raster')
+
+def run_text(first: Cell, end: Cell) -> str:
+    # A straight run varies in one coordinate, so its cells share one template
+    layer, x, y = first
+    if x != end[1]:
+        template, start, stop = f"({layer}, %d, {y})", x, end[1]
+    elif y != end[2]:
+        template, start, stop = f"({layer}, {x}, %d)", y, end[2]
+    else:
+        template, start, stop = f"(%d, {x}, {y})", layer, end[0]
+    step = 1 if stop >= start else -1
+    return ' '.join(map(template.__mod__, range(start, stop + step, step)))
+
+def format_path(path: Union[SegmentPath, List[Cell]]) -> str:
+    """Format a path as the output file's '(layer, x, y) (layer, x, y) ...' cell list."""
+    if isinstance(path, SegmentPath):
+        return ' '.join([run_text(first, end) for first, end, _ in path.iter_runs()])
+    # One % over a repeated template formats the whole path in a single call
+    return ('(%d, %d, %d) ' * len(path) % tuple(chain.from_iterable(path)))[:-1]
+
+class RoutingWriter:
+    """Stream routed nets to an output file as they complete.
+
+    Output lines and the matching progress messages are buffered and written
+    in batches of batch_size nets, so no full copy of the output is ever held
+    in memory. Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, output_file: str, batch_size: int = 256, quiet: bool = False):
+        self.file = open(output_file, 'w', buffering=1 << 20)
+        self.batch_size = batch_size
+        self.quiet = quiet
+        self.lines: List[str] = []
+        self.messages: List[str] = []
+        self.nets_written = 0
+
+    def __enter__(self) -> 'RoutingWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, net_name: str, result: Optional[Tuple[List[Cell], int, int]]):
+        if result:
+            path, wire_length, via_count = result
+            self.lines.append(f"{net_name} {format_path(path)}\n")
+            self.messages.append(f"Successfully routed {net_name}\nWire length: {wire_length}, Vias: {via_count}\n")
+            self.nets_written += 1
+        else:
+            self.messages.append(f"Warning: Could not route {net_name}\n")
+        if len(self.messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.file.writelines(self.lines)
+        self.lines.clear()
+        if not self.quiet:
+            sys.stdout.writelines(self.messages)
+        self.messages.clear()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+def stats_totals(net_stats: List[NetStats]) -> dict:
+    totals = {field.name: sum(getattr(stats, field.name) for stats in net_stats)
+              for field in fields(NetStats) if field.name not in ('name', 'routed', 'peak_frontier')}
+    totals['routed_nets'] = sum(stats.routed for stats in net_stats)
+    totals['failed_nets'] = len(net_stats) - totals['routed_nets']
+    totals['peak_frontier'] = max((stats.peak_frontier for stats in net_stats), default=0)
+    return totals
+
+def write_table(rows: list, row_type, filename: str, key: str, extra: Optional[dict] = None):
+    """Write dataclass rows as CSV (for a .csv file name) or as JSON under key, with any extra fields."""
+    if filename.lower().endswith('.csv'):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=[field.name for field in fields(row_type)])
+            writer.writeheader()
+            writer.writerows(asdict(row) for row in rows)
+        return
+    with open(filename, 'w') as f:
+        json.dump({key: [asdict(row) for row in rows], **(extra or {})}, f, indent=2)
+        f.write('\n')
+
+def write_stats(net_stats: List[NetStats], filename: str):
+    """Write per-net routing stats as CSV (for a .csv file name) or JSON with totals."""
+    write_table(net_stats, NetStats, filename, 'nets', {'totals': stats_totals(net_stats)})
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from parser import MazeRouterInput
+from design_file import load_design
+from router import Grid, MazeRouter, SegmentPath
+from net_order import net_order
+from global_router import global_route
+from routing_output import RoutingWriter
+
+# Options a route request may set, with their defaults
+ROUTE_OPTIONS = {
+    'via_penalty': None,
+    'wrong_direction_penalty': None,
+    'search': 'astar',
+    'frontier': 'heap',
+    'topology': 'chain',
+    'pattern': 'off',
+    'window_margin': None,
+    'order': 'input',
+    'global_route': None,
+}
+
+@dataclass
+class RoutingSession:
+    """The routed state left by a design's last route request."""
+    router: MazeRouter
+    results: Dict[str, Optional[Tuple[SegmentPath, int, int]]]
+    options: dict
+    route_time: float
+
+    def nbytes(self) -> int:
+        grid = self.router.grid
+        path_finder = self.router.path_finder
+        search_arrays = (len(path_finder.cost) + len(path_finder.parent) +
+                         len(path_finder.reverse_cost) + len(path_finder.reverse_parent)) * 4
+        runs = sum(result[0].runs.itemsize * len(result[0].runs) for result in self.results.values() if result)
+        return grid.size * 9 + search_arrays + runs
+
+@dataclass
+class CachedDesign:
+    """A parsed design and its unrouted grid, plus the session of its last route."""
+    router_input: MazeRouterInput
+    grid: Grid
+    session: Optional[RoutingSession] = None
+
+    def nbytes(self) -> int:
+        router_input = self.router_input
+        size = (router_input.obstructions.nbytes + router_input.pin_data.itemsize * len(router_input.pin_data) +
+                router_input.net_offsets.itemsize * len(router_input.net_offsets) +
+                sum(len(name) for name in router_input.net_names) + self.grid.size * 9)
+        if router_input.obstruction_map is not None:
+            size += router_input.obstruction_map.nbytes
+        if self.session is not None:
+            size += self.session.nbytes()
+        return size
+
+class DesignCache:
+    """Least-recently-used cache of designs, bounded by their estimated memory.
+
+    Designs are keyed by absolute path, modification time and size, so an edited
+    file is parsed again. The most recently used design is never evicted, even
+    if it alone exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.designs: 'OrderedDict[Tuple[str, int, int], CachedDesign]' = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def key(self, filename: str) -> Tuple[str, int, int]:
+        path = os.path.abspath(filename)
+        status = os.stat(path)
+        return path, status.st_mtime_ns, status.st_size
+
+    def get(self, filename: str) -> CachedDesign:
+        key = self.key(filename)
+        design = self.designs.get(key)
+        if design is None:
+            # An older version of the same file is stale
+            for stale in [other for other in self.designs if other[0] == key[0]]:
+                del self.designs[stale]
+            router_input = load_design(filename)
+            # Build the unrouted grid once; every route starts from a copy of it
+            design = CachedDesign(router_input, MazeRouter(router_input).grid)
+            self.designs[key] = design
+            self.loads += 1
+        else:
+            self.hits += 1
+        self.designs.move_to_end(key)
+        self.evict()
+        return design
+
+    def evict(self):
+        total = self.nbytes()
+        while total > self.max_bytes and len(self.designs) > 1:
+            _, design = self.designs.popitem(last=False)
+            total -= design.nbytes()
+            self.evictions += 1
+
+    def nbytes(self) -> int:
+        return sum(design.nbytes() for design in self.designs.values())
+
+def totals(session: RoutingSession) -> dict:
+    results = [result for result in session.results.values() if result]
+    path_finder = session.router.path_finder
+    return {
+        'routed_nets': len(results),
+        'failed_nets': len(session.results) - len(results),
+        'wire_length': sum(result[1] for result in results),
+        'vias': sum(result[2] for result in results),
+        'nodes_expanded': path_finder.nodes_expanded,
+        'rejected_searches': session.router.rejected_searches,
+        'pattern_hits': path_finder.pattern_hits,
+        'route_time': round(session.route_time, 6),
+    }
+
+def write_session(session: RoutingSession, output_file: str):
+    with RoutingWriter(output_file, quiet=True) as writer:
+        for name, result in session.results.items():
+            if result:
+                writer.write(name, result)
+
+def plot_session(session: RoutingSession, output_dir: str, style: str):
+    # matplotlib is only imported by the first request that asks for a plot
+    from visualization import plot_routed_nets
+    results = {name: result for name, result in session.results.items() if result}
+    plot_routed_nets(results, session.router.input, output_dir, session.router.grid, style)
+
+class RouterService:
+    """Handle route, reroute-net, metrics and cache requests against a design cache."""
+
+    def __init__(self, cache: DesignCache):
+        self.cache = cache
+        # Requests share cached grids, so they are handled one at a time
+        self.lock = threading.Lock()
+
+    def handle(self, request: dict) -> dict:
+        op = request.get('op')
+        handler = {'route': self.route, 'reroute-net': self.reroute_net,
+                   'metrics': self.metrics, 'cache': self.cache_info}.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown op '{op}'. Expected one of: route, reroute-net, metrics, cache.")
+        started = time.perf_counter()
+        with self.lock:
+            response = handler(request)
+        response['time'] = round(time.perf_counter() - started, 6)
+        return response
+
+    def design(self, request: dict) -> CachedDesign:
+        if 'design' not in request:
+            raise ValueError("Request needs a 'design' file.")
+        return self.cache.get(request['design'])
+
+    def session(self, request: dict) -> RoutingSession:
+        design = self.design(request)
+        if design.session is None:
+            raise ValueError(f"Design '{request['design']}' has not been routed yet.")
+        return design.session
+
+    def finish(self, session: RoutingSession, request: dict):
+        # Optional output file and plot shared by route and reroute-net
+        if request.get('output'):
+            write_session(session, request['output'])
+        if request.get('plot'):
+            output_dir = request.get('plot_dir') or os.path.dirname(request.get('output') or '') or '.'
+            plot_session(session, output_dir, request['plot'])
+
+    def route(self, request: dict) -> dict:
+        design = self.design(request)
+        unknown = set(request) - set(ROUTE_OPTIONS) - {'op', 'design', 'output', 'plot', 'plot_dir'}
+        if unknown:
+            raise ValueError(f"Unknown route options: {', '.join(sorted(unknown))}.")
+        options = {name: request.get(name, default) for name, default in ROUTE_OPTIONS.items()}
+        router_input = design.router_input
+        # Every option is checked before routing starts, so a bad request keeps the previous session
+        router = MazeRouter(router_input, options['via_penalty'], options['wrong_direction_penalty'],
+                            options['search'], options['topology'], options['window_margin'], options['frontier'],
+                            grid=design.grid.copy(), pattern=options['pattern'])
+        order = net_order(router_input, options['order'])
+        started = time.perf_counter()
+        if options['global_route'] is not None:
+            router.use_global_routing(global_route(router_input, options['global_route']))
+        results = {net['name']: result for net, result in router.route_nets(order)}
+        design.session = RoutingSession(router, results, options, time.perf_counter() - started)
+        self.finish(design.session, request)
+        self.cache.evict()
+        return {'ok': True, **totals(design.session)}
+
+    def reroute_net(self, request: dict) -> dict:
+        session = self.session(request)
+        name = request.get('net')
+        if name not in session.results:
+            raise ValueError(f"Net '{name}' is not in the design.")
+        router = session.router
+        net = router.input.nets[router.input.net_names.index(name)]
+        started = time.perf_counter()
+        result = router.reroute_net(net)
+        session.results[name] = result
+        route_time = time.perf_counter() - started
+        self.finish(session, request)
+        return {'ok': True, 'net': name, 'routed': result is not None,
+                'wire_length': result[1] if result else 0, 'vias': result[2] if result else 0,
+                'route_time': round(route_time, 6)}
+
+    def metrics(self, request: dict) -> dict:
+        session = self.session(request)
+        name = request.get('net')
+        if name is None:
+            return {'ok': True, **totals(session)}
+        if name not in session.results:
+            raise ValueError(f"Net '{name}' is not in the design.")
+        result = session.results[name]
+        return {'ok': True, 'net': name, 'routed': result is not None,
+                'wire_length': result[1] if result else 0, 'vias': result[2] if result else 0}
+
+    def cache_info(self, request: dict) -> dict:
+        cache = self.cache
+        return {'ok': True, 'designs': [key[0] for key in cache.designs], 'bytes': cache.nbytes(),
+                'max_bytes': cache.max_bytes, 'hits': cache.hits, 'loads': cache.loads, 'evictions': cache.evictions}
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered by one JSON response line; a
+    # connection may send any number of requests
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object.")
+                response = self.server.service.handle(request)
+            except (ValueError, KeyError, TypeError, OSError) as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+class UnixRouterServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPRouterServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class RouterClient:
+    """Keep one connection to a routing server and send it requests.
+
+    client = RouterClient('/tmp/maze-router.sock')
+    client.request(op='route', design='test_cases/test1/input.txt', output='out.txt')
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, port: Optional[int] = None):
+        if port is not None:
+            self.socket = socket.create_connection(('127.0.0.1', port))
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, **fields) -> dict:
+        self.file.write(json.dumps(fields).encode('utf-8') + b'\n')
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Long-lived maze routing server with a warm design cache')
+    parser.add_argument('--socket', default='/tmp/maze-router.sock',
+                      help='Unix socket path to listen on (default: /tmp/maze-router.sock).')
+    parser.add_argument('--port', type=int, default=None,
+                      help='Listen on this localhost TCP port instead of a Unix socket.')
+    parser.add_argument('--cache-mb', type=float, default=512,
+                      help='Memory budget for cached designs and routed grids in MB (default: 512).')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    service = RouterService(DesignCache(int(args.cache_mb * (1 << 20))))
+    if args.port is not None:
+        server = TCPRouterServer(('127.0.0.1', args.port), RequestHandler)
+        address = f"127.0.0.1:{args.port}"
+    else:
+        # Replace a socket left behind by a previous server, but never another kind of file
+        if os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+            os.unlink(args.socket)
+        server = UnixRouterServer(args.socket, RequestHandler)
+        address = args.socket
+    server.service = service
+    print(f"Routing server listening on {address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.port is None and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()
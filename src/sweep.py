@@ -0,0 +1,149 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+from router import Grid, MazeRouter
+from routing_output import RoutingWriter
+
+# Per-process router used by pool workers, built once by init_sweep_worker
+_worker: Optional[Tuple[MazeRouter, shared_memory.SharedMemory, dict]] = None
+
+@dataclass
+class SweepResult:
+    via_penalty: int
+    wrong_direction_penalty: int
+    wire_length: int
+    vias: int
+    routed_nets: int
+    failed_nets: int
+    nodes_expanded: int
+    runtime: float
+    pareto: bool = False
+
+def penalty_grid(via_penalties: List[int], wrong_direction_penalties: List[int]) -> List[Tuple[int, int]]:
+    """Every (via penalty, wrong-direction penalty) pair, via penalty major."""
+    return [(via, wrong) for via in via_penalties for wrong in wrong_direction_penalties]
+
+def setting_name(via_penalty: int, wrong_direction_penalty: int) -> str:
+    return f"via{via_penalty}_wrong{wrong_direction_penalty}"
+
+def grid_views(buffer, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Shared grid layout: owner int32[size], pin_refs int32[size], blocked uint8[size]
+    owner = np.frombuffer(buffer, dtype=np.intc, count=size)
+    pin_refs = np.frombuffer(buffer, dtype=np.intc, count=size, offset=size * 4)
+    blocked = np.frombuffer(buffer, dtype=np.uint8, count=size, offset=size * 8)
+    return owner, pin_refs, blocked
+
+def init_sweep_worker(router_input, search: str, topology: str, window_margin: Optional[int], frontier: str,
+                      pattern: str, order: Optional[List[int]], output_dir: Optional[str], plot: Optional[str], shm_name: str):
+    global _worker
+    shm = shared_memory.SharedMemory(name=shm_name)
+    grid = Grid(router_input.grid_width, router_input.grid_height)
+    owner, pin_refs, blocked = grid_views(shm.buf, grid.size)
+    grid.pin_refs_map.reshape(-1)[:] = pin_refs
+    grid.owner_map.reshape(-1)[:] = owner
+    grid.blocked_map.reshape(-1)[:] = blocked
+    del owner, pin_refs, blocked
+    router = MazeRouter(router_input, search=search, topology=topology, window_margin=window_margin,
+                        frontier=frontier, grid=grid, pattern=pattern)
+    _worker = (router, shm, {'order': order, 'output_dir': output_dir, 'plot': plot})
+
+def route_setting(setting: Tuple[int, int]) -> SweepResult:
+    """Route the whole design under one penalty setting in a worker process.
+
+    The worker's grid is reset to the shared unrouted grid first, so every
+    setting starts from the same state a fresh router would.
+    """
+    router, shm, options = _worker
+    via_penalty, wrong_direction_penalty = setting
+    grid = router.grid
+    path_finder = router.path_finder
+    owner, _, blocked = grid_views(shm.buf, grid.size)
+    grid.owner_map.reshape(-1)[:] = owner
+    grid.blocked_map.reshape(-1)[:] = blocked
+    del owner, blocked
+    router.connectivity.build()
+    router.set_penalties(via_penalty, wrong_direction_penalty)
+    path_finder.nodes_expanded = path_finder.window_hits = path_finder.window_misses = 0
+    path_finder.pattern_hits = path_finder.pattern_misses = 0
+    router.rejected_searches = 0
+
+    output_dir = options['output_dir']
+    name = setting_name(via_penalty, wrong_direction_penalty)
+    writer = RoutingWriter(os.path.join(output_dir, f"{name}.txt"), quiet=True) if output_dir else None
+    routing_results = {} if options['plot'] else None
+    wire_length = vias = routed = failed = 0
+    started = time.perf_counter()
+    for net, result in router.route_nets(options['order']):
+        if not result:
+            failed += 1
+            continue
+        routed += 1
+        wire_length += result[1]
+        vias += result[2]
+        if writer:
+            writer.write(net['name'], result)
+        if routing_results is not None:
+            routing_results[net['name']] = result
+    runtime = time.perf_counter() - started
+    if writer:
+        writer.close()
+    if routing_results is not None:
+        # matplotlib is only imported by workers that plot
+        from visualization import plot_routed_nets
+        plot_dir = os.path.join(output_dir, name)
+        os.makedirs(plot_dir, exist_ok=True)
+        plot_routed_nets(routing_results, router.input, plot_dir, grid, options['plot'])
+    return SweepResult(via_penalty=via_penalty, wrong_direction_penalty=wrong_direction_penalty,
+                       wire_length=wire_length, vias=vias, routed_nets=routed, failed_nets=failed,
+                       nodes_expanded=path_finder.nodes_expanded, runtime=runtime)
+
+def mark_pareto(results: List[SweepResult]):
+    """Flag the settings no other setting beats on failed nets, wire length and vias at once."""
+    scores = [(result.failed_nets, result.wire_length, result.vias) for result in results]
+    for result, score in zip(results, scores):
+        result.pareto = not any(all(a <= b for a, b in zip(other, score)) and other != score for other in scores)
+
+def run_sweep(router: MazeRouter, settings: List[Tuple[int, int]], jobs: int, order: Optional[List[int]] = None,
+              output_dir: Optional[str] = None, plot: Optional[str] = None) -> List[SweepResult]:
+    """Route the router's design once per penalty setting across a process pool.
+
+    The router's unrouted grid (obstructions, pin references and owners) is
+    copied into shared memory once; each worker builds its router on a copy of
+    it and resets to it before every setting. Each setting's result matches a
+    fresh serial run with the same penalties. With output_dir, every setting
+    writes its routed output to <output_dir>/via<V>_wrong<W>.txt, and with plot
+    (a visualization style) its layer views to <output_dir>/via<V>_wrong<W>/.
+    """
+    if plot and not output_dir:
+        raise ValueError("Sweep plots need an output directory.")
+    grid = router.grid
+    shm = shared_memory.SharedMemory(create=True, size=max(grid.size * 9, 1))
+    try:
+        owner, pin_refs, blocked = grid_views(shm.buf, grid.size)
+        owner[:] = grid.owner_map.reshape(-1)
+        pin_refs[:] = grid.pin_refs_map.reshape(-1)
+        blocked[:] = grid.blocked_map.reshape(-1)
+        del owner, pin_refs, blocked
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_sweep_worker,
+                                 initargs=(router.input, router.path_finder.search, router.topology,
+                                           router.path_finder.window_margin, router.path_finder.frontier,
+                                           router.path_finder.pattern, order, output_dir, plot, shm.name)) as pool:
+            results = list(pool.map(route_setting, settings))
+    finally:
+        shm.close()
+        shm.unlink()
+    mark_pareto(results)
+    return results
+
+def format_sweep_table(results: List[SweepResult]) -> str:
+    header = f"{'Via':>5} {'Wrong':>5} {'Wire length':>12} {'Vias':>8} {'Failed':>7} {'Nodes':>12} {'Runtime':>9}  Pareto"
+    lines = [header, '-' * len(header)]
+    for result in results:
+        lines.append(f"{result.via_penalty:>5} {result.wrong_direction_penalty:>5} {result.wire_length:>12} "
+                     f"{result.vias:>8} {result.failed_nets:>7} {result.nodes_expanded:>12} "
+                     f"{result.runtime:>8.3f}s  {'*' if result.pareto else ''}")
+    return '\n'.join(lines)
@@ -1,94 +1,203 @@
 import os
+import sys
+import argparse
+import traceback
+import multiprocessing
+import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
 import matplotlib.patches as patches
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import ListedColormap
 from matplotlib.lines import Line2D
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional
+from router import Grid, SegmentPath, OBSTRUCTION
+from design_file import load_design
+from eco import read_routed_output
+from routing_output import PLOT_STYLES
+
+# Grids with more cells than this are painted into images instead of drawn cell by cell
+RASTER_CELLS = 100 * 100
+# Raster layer images are downsampled by a whole factor to at most this many pixels a side
+MAX_IMAGE_SIDE = 1000
+# The raster 3D view scatters one obstacle marker per block of a coarser grid of this many blocks a side
+MAX_3D_SIDE = 200
+
+NET_COLORS = ['blue', 'green', 'purple', 'orange', 'brown', 'pink']
+# Raster pixel values: 0 empty, 1 obstacle, then one per net color, then via
+OBSTACLE_PIXEL = 1
+VIA_PIXEL = 2 + len(NET_COLORS)
+RASTER_COLORMAP = ListedColormap(['white', (1.0, 0.0, 0.0, 0.3)] + NET_COLORS + ['red'])
+
+def obstacle_mask(router_input, layer: int, grid: Optional[Grid] = None) -> np.ndarray:
+    """Return a (y, x) boolean mask of the obstacles on a 0-based layer."""
+    if grid is not None:
+        return grid.owner_map[layer] == OBSTRUCTION
+    if router_input.obstruction_map is not None:
+        return router_input.obstruction_map[layer].astype(bool)
+    width, height = router_input.grid_width, router_input.grid_height
+    mask = np.zeros((height, width), dtype=bool)
+    cells = np.asarray(router_input.obstructions, dtype=np.int64).reshape(-1, 3)
+    cells = cells[(cells[:, 0] == layer + 1) & (cells[:, 1] >= 0) & (cells[:, 1] < width) &
+                  (cells[:, 2] >= 0) & (cells[:, 2] < height)]
+    mask[cells[:, 2], cells[:, 1]] = True
+    return mask
+
+def segment_path(path) -> SegmentPath:
+    """Return a path as a SegmentPath, converting plain cell lists read from output files."""
+    return path if isinstance(path, SegmentPath) else SegmentPath.from_cells(path)
+
+def path_polylines(path: SegmentPath) -> List[List[Tuple[int, int, int]]]:
+    """Corner cells of each contiguous stretch of a path; tree-routed nets restart at branch points."""
+    polylines = []
+    for first, end, joined in path.iter_runs():
+        if joined:
+            polylines[-1].append(first)
+        else:
+            polylines.append([first])
+        if end != first:
+            polylines[-1].append(end)
+    return polylines
+
+def downsample_factor(router_input, max_side: int = MAX_IMAGE_SIDE) -> int:
+    return max(1, -(-max(router_input.grid_width, router_input.grid_height) // max_side))
+
+def block_max(image: np.ndarray, factor: int) -> np.ndarray:
+    """Shrink an image by factor, keeping the largest value of each block."""
+    if factor == 1:
+        return image
+    height, width = image.shape
+    padded = np.zeros((-(-height // factor) * factor, -(-width // factor) * factor), dtype=image.dtype)
+    padded[:height, :width] = image
+    return padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor).max(axis=(1, 3))
+
+def layer_legend(ax):
+    legend_elements = [
+        patches.Patch(facecolor='red', alpha=0.3, label='Obstacle'),
+        Line2D([0], [0], color='blue', label='Net Path'),
+        Line2D([0], [0], marker='o', color='r', label='Via',
+               markersize=8, linestyle='None'),
+        Line2D([0], [0], marker='s', color='g', label='Pin',
+               markersize=8, linestyle='None')
+    ]
+    ax.legend(handles=legend_elements, loc='upper right')
 
 def plot_single_layer(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]], 
-                     router_input, layer: int, ax, title: str):
+                     router_input, layer: int, ax, title: str, grid: Optional[Grid] = None):
     """Plot a single layer view."""
     ax.set_title(title)
     ax.set_xlabel("X-axis")
     ax.set_ylabel("Y-axis")
 
     # Set the grid limits
-    ax.set_xlim(-0.5, router_input.grid_width - 0.5)
-    ax.set_ylim(-0.5, router_input.grid_height - 0.5)
+    width, height = router_input.grid_width, router_input.grid_height
+    ax.set_xlim(-0.5, width - 0.5)
+    ax.set_ylim(-0.5, height - 0.5)
 
-    # Draw grid
-    for x in range(router_input.grid_width):
-        ax.axvline(x - 0.5, color='gray', linewidth=0.5, linestyle=':')
-    for y in range(router_input.grid_height):
-        ax.axhline(y - 0.5, color='gray', linewidth=0.5, linestyle=':')
+    # Draw grid; each kind of artist below is one batched collection
+    grid_lines = [((x - 0.5, -0.5), (x - 0.5, height - 0.5)) for x in range(width)]
+    grid_lines += [((-0.5, y - 0.5), (width - 0.5, y - 0.5)) for y in range(height)]
+    ax.add_collection(LineCollection(grid_lines, colors='gray', linewidths=0.5, linestyles=':'))
     ax.grid(False)
 
     # Plot obstacles for this layer
-    for obs in router_input.obstructions:
-        if obs[0] == layer + 1:  # Convert 0-based layer to 1-based
-            ax.add_patch(
-                patches.Rectangle(
-                    (obs[1] - 0.4, obs[2] - 0.4), 0.8, 0.8,
-                    facecolor='red',
-                    alpha=0.3
-                )
-            )
+    ys, xs = np.nonzero(obstacle_mask(router_input, layer, grid))
+    corners = np.array([(-0.4, -0.4), (0.4, -0.4), (0.4, 0.4), (-0.4, 0.4)])
+    ax.add_collection(PolyCollection(np.stack((xs, ys), axis=1)[:, None, :] + corners,
+                                     facecolors='red', alpha=0.3))
 
-    colors = ['blue', 'green', 'purple', 'orange', 'brown', 'pink']
-    
-    # Plot nets
+    wires, wire_colors, via_links, via_link_colors = [], [], [], []
+    via_points, pin_points = [], []
     for idx, (net_name, result) in enumerate(routing_results.items()):
         if not result:
             continue
             
-        path, _, _ = result
-        color = colors[idx % len(colors)]
-        
-        # Filter segments for this layer
-        layer_segments = []
-        for i in range(len(path)-1):
-            curr = path[i]
-            next_point = path[i+1]
-            
-            # If either point is on this layer, draw the segment
-            if curr[0] == layer + 1 or next_point[0] == layer + 1:  # Convert 0-based layer to 1-based
-                layer_segments.append((curr, next_point))
-                
-                # Draw via points
-                if curr[0] != next_point[0]:  # Layer change
-                    if curr[0] == layer + 1:
-                        ax.plot(curr[1], curr[2], 'ro', markersize=8, alpha=0.6)
-                    else:
-                        ax.plot(next_point[1], next_point[2], 'ro', markersize=8, alpha=0.6)
+        path = segment_path(result[0])
+        color = NET_COLORS[idx % len(NET_COLORS)]
         
-        # Draw segments
-        for start, end in layer_segments:
-            if start[0] == layer + 1 and end[0] == layer + 1:  # Same layer segment
-                ax.plot([start[1], end[1]], [start[2], end[2]], 
-                       color=color, linewidth=2, label=net_name if idx == 0 else "")
-            else:  # Via connection
-                ax.plot([start[1], end[1]], [start[2], end[2]], 
-                       color=color, linewidth=2, linestyle=':', alpha=0.5)
+        # Each straight run is one line; a joined run also links back to the previous run's end
+        last = None
+        for first, end, joined in path.iter_runs():
+            moves = [(last, first), (first, end)] if joined else [(first, end)]
+            last = end
+            for curr, next_point in moves:
+                # If either point is on this layer, draw the segment
+                if curr == next_point or (curr[0] != layer + 1 and next_point[0] != layer + 1):  # Convert 0-based layer to 1-based
+                    continue
+                segment = ((curr[1], curr[2]), (next_point[1], next_point[2]))
+                if curr[0] == next_point[0]:  # Same layer segment
+                    wires.append(segment)
+                    wire_colors.append(color)
+                else:  # Via connection
+                    via_links.append(segment)
+                    via_link_colors.append(color)
+                    via_points.append(curr if curr[0] == layer + 1 else next_point)
         
         # Mark start/end points on this layer
-        for point in [path[0], path[-1]]:
-            if point[0] == layer + 1:
-                ax.plot(point[1], point[2], 'gs', markersize=10, alpha=0.8)
+        pin_points.extend(point for point in (path[0], path[-1]) if point[0] == layer + 1)
 
-    # Create legend
-    legend_elements = [
-        patches.Patch(facecolor='red', alpha=0.3, label='Obstacle'),
-        Line2D([0], [0], color='blue', label='Net Path'),
-        Line2D([0], [0], marker='o', color='r', label='Via',
-               markersize=8, linestyle='None'),
-        Line2D([0], [0], marker='s', color='g', label='Pin',
-               markersize=8, linestyle='None')
-    ]
-    ax.legend(handles=legend_elements, loc='upper right')
+    ax.add_collection(LineCollection(wires, colors=wire_colors, linewidths=2))
+    ax.add_collection(LineCollection(via_links, colors=via_link_colors, linewidths=2, linestyles=':', alpha=0.5))
+    if via_points:
+        ax.plot([p[1] for p in via_points], [p[2] for p in via_points], 'ro', markersize=8, alpha=0.6)
+    if pin_points:
+        ax.plot([p[1] for p in pin_points], [p[2] for p in pin_points], 'gs', markersize=10, alpha=0.8)
+    layer_legend(ax)
+
+def plot_raster_layer(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]],
+                      router_input, layer: int, ax, title: str, grid: Optional[Grid] = None):
+    """Plot a single layer view as one image of obstacle, wire and via pixels."""
+    ax.set_title(title)
+    ax.set_xlabel("X-axis")
+    ax.set_ylabel("Y-axis")
+    width, height = router_input.grid_width, router_input.grid_height
+
+    image = obstacle_mask(router_input, layer, grid).astype(np.uint8) * OBSTACLE_PIXEL
+    pins, via_points = [], []
+    for idx, (net_name, result) in enumerate(routing_results.items()):
+        if not result:
+            continue
+        path = segment_path(result[0])
+        pixel = 2 + idx % len(NET_COLORS)
+        net_vias = []
+        last = None
+        # Straight runs paint as one slice each; vias are the layer changes within or between runs
+        for first, end, joined in path.iter_runs():
+            if first[0] != end[0]:
+                net_vias.append(first if first[0] == layer + 1 else end)
+            elif first[0] == layer + 1:
+                image[min(first[2], end[2]):max(first[2], end[2]) + 1,
+                      min(first[1], end[1]):max(first[1], end[1]) + 1] = pixel
+            if joined and last[0] != first[0]:
+                net_vias.append(last if last[0] == layer + 1 else first)
+            last = end
+        for via in net_vias:
+            image[via[2], via[1]] = VIA_PIXEL
+        via_points.extend(net_vias)
+        pins.extend(point for point in (path[0], path[-1]) if point[0] == layer + 1)
+
+    # Wires and vias outrank obstacles, so thin features survive downsampling
+    factor = downsample_factor(router_input)
+    image = block_max(image, factor)
+    ax.imshow(image, cmap=RASTER_COLORMAP, vmin=0, vmax=VIA_PIXEL, interpolation='nearest', origin='lower',
+              extent=(-0.5, image.shape[1] * factor - 0.5, -0.5, image.shape[0] * factor - 0.5))
+    # Pixel-sized vias and pins are hard to see, so they are also overlaid as small markers
+    if via_points:
+        ax.scatter([via[1] for via in via_points], [via[2] for via in via_points], s=2, marker='o', color='r', alpha=0.6)
+    if pins:
+        ax.scatter([pin[1] for pin in pins], [pin[2] for pin in pins], s=4, marker='s', color='g', alpha=0.8)
+    ax.set_xlim(-0.5, width - 0.5)
+    ax.set_ylim(-0.5, height - 0.5)
+    layer_legend(ax)
 
 def plot_3d_view(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]], 
-                router_input, ax):
-    """Plot 3D view of the routing."""
+                router_input, ax, grid: Optional[Grid] = None, raster: bool = False):
+    """Plot 3D view of the routing.
+
+    With raster set, obstacles are thinned to one marker per downsampled block
+    and wires are drawn as one collection without a per-net legend.
+    """
     ax.set_title('3D View')
     ax.set_xlabel('X-axis')
     ax.set_ylabel('Y-axis')
@@ -101,54 +210,80 @@ def plot_3d_view(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], in
     ax.set_zticks([1, 2])
 
     # Plot obstacles
-    for obs in router_input.obstructions:
-        ax.scatter(obs[1], obs[2], obs[0], color="red", s=100, alpha=0.5)
+    factor = downsample_factor(router_input, MAX_3D_SIDE) if raster else 1
+    for layer in range(2):
+        ys, xs = np.nonzero(block_max(obstacle_mask(router_input, layer, grid), factor))
+        ax.scatter(xs * factor, ys * factor, layer + 1, color="red", s=100 if not raster else 1, alpha=0.5)
 
-    colors = ['blue', 'green', 'purple', 'orange', 'brown', 'pink']
+    if raster:
+        runs, run_colors, ends = [], [], []
+        for idx, (net_name, result) in enumerate(routing_results.items()):
+            if not result:
+                continue
+            path = segment_path(result[0])
+            color = NET_COLORS[idx % len(NET_COLORS)]
+            for polyline in path_polylines(path):
+                runs.append([(p[1], p[2], p[0]) for p in polyline])
+                run_colors.append(color)
+            ends.extend((path[0], path[-1]))
+        ax.add_collection3d(Line3DCollection(runs, colors=run_colors, linewidths=0.5))
+        if ends:
+            ax.scatter([p[1] for p in ends], [p[2] for p in ends], [p[0] for p in ends], color='g', s=2)
+        return
 
     # Plot routed nets
     for idx, (net_name, result) in enumerate(routing_results.items()):
         if not result:
             continue
             
-        path, _, _ = result
-        color = colors[idx % len(colors)]
-        x_coords = [p[1] for p in path]
-        y_coords = [p[2] for p in path]
-        z_coords = [p[0] for p in path]
+        path = segment_path(result[0])
+        color = NET_COLORS[idx % len(NET_COLORS)]
         
         # Plot path
-        ax.plot(x_coords, y_coords, z_coords, color=color, linewidth=2, label=net_name)
+        for run_idx, run in enumerate(path_polylines(path)):
+            ax.plot([p[1] for p in run], [p[2] for p in run], [p[0] for p in run],
+                    color=color, linewidth=2, label=net_name if run_idx == 0 else None)
         
         # Mark start and end points
-        ax.scatter(x_coords[0], y_coords[0], z_coords[0], color=color, s=100, marker='o')
-        ax.scatter(x_coords[-1], y_coords[-1], z_coords[-1], color=color, s=100, marker='s')
+        ax.scatter(path[0][1], path[0][2], path[0][0], color=color, s=100, marker='o')
+        ax.scatter(path[-1][1], path[-1][2], path[-1][0], color=color, s=100, marker='s')
 
     ax.legend()
 
 def plot_routed_nets(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]], 
-                    router_input, output_dir: str):
-    """Create separate layer views and 3D view."""
+                    router_input, output_dir: str, grid: Optional[Grid] = None, style: str = 'auto'):
+    """Create separate layer views and 3D view.
+
+    style 'vector' draws every grid line, obstacle and wire as its own shape;
+    'raster' paints each layer into an image, downsampled to MAX_IMAGE_SIDE
+    pixels a side; 'auto' rasterizes grids larger than RASTER_CELLS.
+    """
+    if style not in PLOT_STYLES:
+        raise ValueError(f"Unknown plot style '{style}'. Expected one of: {', '.join(PLOT_STYLES)}.")
+    raster = style == 'raster' or (style == 'auto' and
+                                   router_input.grid_width * router_input.grid_height > RASTER_CELLS)
+    plot_layer = plot_raster_layer if raster else plot_single_layer
+
     # Create figure with 3 subplots side by side
     fig = plt.figure(figsize=(15, 5))
     
     # Layer 1 view
     ax1 = fig.add_subplot(131)
-    plot_single_layer(routing_results, router_input, 0, ax1, "Layer 1 (M1)")
+    plot_layer(routing_results, router_input, 0, ax1, "Layer 1 (M1)", grid)
     
     # Layer 2 view
     ax2 = fig.add_subplot(132)
-    plot_single_layer(routing_results, router_input, 1, ax2, "Layer 2 (M2)")
+    plot_layer(routing_results, router_input, 1, ax2, "Layer 2 (M2)", grid)
     
     # 3D view
     ax3 = fig.add_subplot(133, projection='3d')
-    plot_3d_view(routing_results, router_input, ax3)
+    plot_3d_view(routing_results, router_input, ax3, grid, raster)
     
     plt.tight_layout()
     plt.savefig(os.path.join(output_dir, "layer_views.png"), dpi=300, bbox_inches='tight')
     plt.close(fig)
   
-def plot_2d_routed_nets(routing_results, router, ax):
+def plot_2d_routed_nets(routing_results, router: Grid, ax):
     """Plot 2D view with all layers combined."""
     # Set the grid limits
     ax.set_xlim(-0.5, router.width - 0.5)
@@ -162,18 +297,16 @@ def plot_2d_routed_nets(routing_results, router, ax):
     ax.grid(False)
 
     # Plot obstacles
-    for layer in range(router.num_layers):
-        for y in range(router.height):
-            for x in range(router.width):
-                if router.grid[layer][y][x]['obstacle']:
-                    ax.add_patch(
-                        patches.Rectangle(
-                            (x - 0.3, y - 0.3), 0.6, 0.6,
-                            edgecolor='red',
-                            facecolor='red',
-                            alpha=0.5
-                        )
-                    )
+    _, ys, xs = np.nonzero(router.owner_map == OBSTRUCTION)
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        ax.add_patch(
+            patches.Rectangle(
+                (x - 0.3, y - 0.3), 0.6, 0.6,
+                edgecolor='red',
+                facecolor='red',
+                alpha=0.5
+            )
+        )
 
     # Define color and style dictionaries
     colors = {
@@ -273,4 +406,64 @@ def plot_2d_routed_nets(routing_results, router, ax):
     ]
 
     ax.legend(handles=legend_elements, loc='upper right')
-    plt.grid(False)
\ No newline at end of file
+    plt.grid(False)
+
+def plot_and_report(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]],
+                    router_input, output_dir: str, style: str = 'auto'):
+    plot_routed_nets(routing_results, router_input, output_dir, style=style)
+    print(f"\nVisualizations saved in {output_dir}", flush=True)
+
+def plot_in_background(routing_results: Dict[str, Tuple[List[Tuple[int, int, int]], int, int]],
+                       router_input, output_dir: str, style: str = 'auto'):
+    """Render layer_views.png in a detached process and return at once.
+
+    The worker takes obstacles from router_input rather than a routed grid, so
+    the caller can drop its router while the plot renders. Where os.fork is
+    available the renderer is double-forked into its own session, so the
+    caller can exit before the image is saved; elsewhere it falls back to a
+    non-daemon worker, which the interpreter waits for before exiting.
+    """
+    if not hasattr(os, 'fork'):
+        multiprocessing.Process(target=plot_and_report, args=(routing_results, router_input, output_dir, style)).start()
+        return
+    # Output still buffered here would otherwise be written again by the renderer
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    # The intermediate child starts a new session, forks the renderer and exits
+    # at once, so nothing in the caller waits for the image
+    status = 0
+    try:
+        os.setsid()
+        if os.fork() == 0:
+            plot_and_report(routing_results, router_input, output_dir, style)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Render the layer views of an already routed design')
+    parser.add_argument('input_file', help='Path to the design that was routed (text or compiled)')
+    parser.add_argument('routed_file', help='Path to the routed output file')
+    parser.add_argument('--style', choices=PLOT_STYLES, default='auto',
+                      help='Layer view renderer (default: auto, raster above RASTER_CELLS cells).')
+    parser.add_argument('--output-dir', default=None,
+                      help='Folder for layer_views.png (default: the folder of the routed file).')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    router_input = load_design(args.input_file)
+    routing_results = {name: (path, 0, 0) for name, path in read_routed_output(args.routed_file).items()}
+    output_dir = args.output_dir if args.output_dir is not None else os.path.dirname(args.routed_file)
+    plot_and_report(routing_results, router_input, output_dir, args.style)
+
+if __name__ == "__main__":
+    main()